@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+
+from filecache import cache_path, open_npy
+from pools import PoolBuilder
+
+
+#Frames are reduced to this width before differencing
+SMALL_WIDTH = 64
+
+
+class ActivityStore:
+    """
+    How much each frame of a video differs from the one before inside a
+    crop: the mean absolute difference of the frames reduced to grey and
+    SMALL_WIDTH pixels wide. Kept in the cache dir per file and crop as a
+    memory mapped float32 array plus a mask of which frames are done, like
+    ThumbnailStore, so it is computed once and can be filled by several
+    processes at once.
+    """
+
+    def __init__(self, filename, num_frames, crop_vals):
+        self.filename = filename
+        self.num_frames = num_frames
+        self.crop_vals = crop_vals
+        self.path = activity_path(filename, crop_vals)
+        self.values = open_npy(self.path, (num_frames,), np.float32)
+        self.done = open_npy(self.path[:-4] + '.done.npy', (num_frames,), np.uint8)
+
+    def complete(self):
+        return bool(self.done.all())
+
+    def threshold(self, k=5.0):
+        #Activity well above the typical frame to frame noise: median plus
+        #k times the median absolute deviation of the frames done so far.
+        values = self.values[self.done.astype(bool)]
+        if len(values) == 0:
+            return np.inf
+        median = np.median(values)
+        mad = np.median(np.abs(values - median))
+        return median + k * max(mad, 1e-3 * max(median, 1.0))
+
+    def events(self, threshold):
+        #Frames where activity rises to threshold from below it
+        above = (self.values >= threshold) & self.done.astype(bool)
+        onsets = above.copy()
+        onsets[1:] &= ~above[:-1]
+        return np.flatnonzero(onsets)
+
+    def next_event(self, n, threshold):
+        events = self.events(threshold)
+        i = np.searchsorted(events, n, side='right')
+        return int(events[i]) if i < len(events) else None
+
+    def previous_event(self, n, threshold):
+        events = self.events(threshold)
+        i = np.searchsorted(events, n, side='left')
+        return int(events[i - 1]) if i > 0 else None
+
+
+def activity_path(filename, crop_vals):
+    (x0, x1), (y0, y1) = crop_vals
+    return cache_path(filename, '.activity{}_{}_{}_{}.npy'.format(x0, x1, y0, y1))
+
+
+def _small(frame, roi):
+    frame = frame[roi]
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    h, w = frame.shape
+    width = min(SMALL_WIDTH, w)
+    height = max(1, h * width // w)
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def _compute(filename, num_frames, crop_vals, start, stop):
+    #Runs in a worker process reading start-1 to stop in order, so the
+    #chunk is decoded forward from one seek.
+    from readcropvid import open_worker_reader
+    store = ActivityStore(filename, num_frames, crop_vals)
+    readvid = open_worker_reader(filename)
+    (x0, x1), (y0, y1) = crop_vals
+    roi = (slice(y0, y1), slice(x0, x1))
+    try:
+        previous = _small(readvid.read_uncropped(n=max(start - 1, 0), cache=False), roi)
+        for n in range(start, stop):
+            small = _small(readvid.read_uncropped(n=n, cache=False), roi) if n > 0 else previous
+            store.values[n] = np.abs(small - previous).mean()
+            store.done[n] = 1
+            previous = small
+        store.values.flush()
+        store.done.flush()
+    finally:
+        readvid.close()
+
+
+class ActivityBuilder(PoolBuilder):
+    """
+    Fills an ActivityStore using a pool of worker processes, each taking
+    chunk consecutive frames at a time. Chunks already done are skipped.
+    """
+    label = 'Activity'
+
+    def __init__(self, store, workers=2, chunk=500):
+        super().__init__(workers)
+        self.store = store
+        self.chunk = chunk
+
+    def batches(self):
+        todo = [start for start in range(0, self.store.num_frames, self.chunk)
+                if not self.store.done[start:start + self.chunk].all()]
+        while todo:
+            batch, todo = todo[:self.workers], todo[self.workers:]
+            yield [(_compute, (self.store.filename, self.store.num_frames, self.store.crop_vals, start,
+                               min(start + self.chunk, self.store.num_frames)))
+                   for start in batch]
@@ -0,0 +1,118 @@
+'''
+Crop, trim and export many videos without the viewer.
+
+    python batch.py manifest.json --workers 4
+
+The manifest is a JSON list with one entry per video:
+
+    [{"filename": "/data/run1.mp4",
+      "output": "/data/run1_crop.mp4",
+      "crop": [[x0, x1], [y0, y1]],
+      "frames": [start, stop, step],
+      "stills": [0, 500]}]
+
+Only filename is required. It can be anything the viewer opens: a video,
+an image sequence directory or glob pattern, a TIFF stack, a .npy file or
+file.h5::/path/to/dataset. output defaults to <name>_crop.mp4 next to the
+video, crop to the full frame and frames to the whole video. An output
+ending .png, .tif, .npy or .h5 saves the frames for analysis instead of
+as a video (see writers). stills lists
+frames to save as <output name>_<frame>.png. Files are processed in a pool
+of worker processes, one file per worker at a time.
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from labvision.images import save
+from filecache import is_pattern
+from framesources import DATASET_SEP
+from readcropvid import open_worker_reader
+from export import ExportJob
+
+
+def process_entry(entry):
+    #Runs in a worker process. Returns a summary dict for the file.
+    filename = entry['filename']
+    #The file itself, without an HDF5 dataset name or a sequence's pattern
+    path = filename.partition(DATASET_SEP)[0].rstrip(os.sep)
+    if is_pattern(path):
+        path = os.path.dirname(path)
+    elif not os.path.exists(path):
+        raise FileNotFoundError(filename)
+    output = entry.get('output', os.path.splitext(path)[0] + '_crop.mp4')
+    t0 = time.perf_counter()
+
+    readvid = open_worker_reader(filename)
+    if entry.get('crop') is not None:
+        (x0, x1), (y0, y1) = entry['crop']
+        readvid.set_crop(((int(x0), int(x1)), (int(y0), int(y1))))
+    start, stop, step = entry.get('frames') or (0, None, 1)
+    if stop is None:
+        stop = readvid.num_frames
+
+    for n in entry.get('stills', []):
+        save(readvid.read_frame(n=n, cache=False), os.path.splitext(output)[0] + '_{}.png'.format(n))
+    crop_vals = readvid.crop_vals
+    index = readvid.index
+    readvid.close()
+
+    job = ExportJob(filename, output, crop_vals, start, stop, step, index=index)
+    status = job.run()
+    seconds = time.perf_counter() - t0
+    return {'filename': filename,
+            'output': output,
+            'status': status,
+            'error': None if job.error is None else str(job.error),
+            'frames': job.done,
+            'seconds': seconds,
+            'fps': job.done / seconds if seconds > 0 else 0.0}
+
+
+def run_manifest(entries, workers=None):
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_entry, entry): entry for entry in entries}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                #Could not even open the file
+                result = {'filename': futures[future]['filename'], 'output': None,
+                          'status': 'failed', 'error': str(e),
+                          'frames': 0, 'seconds': 0.0, 'fps': 0.0}
+            results.append(result)
+            if result['status'] == 'done':
+                print('{filename}: {frames} frames in {seconds:.1f} s ({fps:.1f} fps) -> {output}'.format(**result))
+            else:
+                print('{filename}: {status} {error}'.format(**result))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Crop, trim and export videos listed in a manifest.')
+    parser.add_argument('manifest', help='JSON list of {"filename", "output", "crop", "frames", "stills"}')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    args = parser.parse_args(argv)
+
+    with open(args.manifest) as f:
+        entries = json.load(f)
+
+    t0 = time.perf_counter()
+    results = run_manifest(entries, workers=args.workers)
+    wall = time.perf_counter() - t0
+
+    done = [r for r in results if r['status'] == 'done']
+    frames = sum(r['frames'] for r in done)
+    print('------------------------------')
+    print('{} of {} files exported, {} frames in {:.1f} s ({:.1f} fps overall)'.format(
+        len(done), len(results), frames, wall, frames / wall if wall > 0 else 0.0))
+    return 0 if len(done) == len(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
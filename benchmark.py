@@ -0,0 +1,267 @@
+'''
+Headless benchmarks for reading, seeking, cropping, display and export.
+
+    python benchmark.py                        # run and print results
+    python benchmark.py --save-baseline        # run and store as the baseline
+    python benchmark.py --compare              # run and check against the baseline
+
+Test videos are synthesised in --workdir (kept between runs) at several
+resolutions, codecs and GOP lengths, so no data is needed. H.264 videos
+with a chosen GOP need PyAV, otherwise only the OpenCV codecs are used.
+Each benchmark is run --repeat times and the best kept. Results are
+written as JSON (--output). With --compare any metric more
+than --threshold worse than the baseline is reported and the exit status
+is 1. Baselines are machine specific so make one on the machine you
+compare on.
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+#Must be set before Qt is imported
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import cv2
+import numpy as np
+
+from readcropvid import ReadCropVideo
+from export import ExportJob
+from frameindex import can_index
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+#(name, width, height, codec, gop). gop None lets the encoder choose.
+VIDEOS = [('vga_mjpg', 640, 480, 'MJPG', None),
+          ('vga_mp4v', 640, 480, 'mp4v', None),
+          ('hd_mp4v', 1920, 1080, 'mp4v', None),
+          ('hd_h264_gop12', 1920, 1080, 'h264', 12),
+          ('hd_h264_gop250', 1920, 1080, 'h264', 250)]
+LARGE_VIDEOS = [('uhd_h264_gop60', 3840, 2160, 'h264', 60)]
+
+#Whether bigger is better for each metric, used when comparing
+HIGHER_IS_BETTER = {'sequential_fps': True, 'seek_p50_ms': False, 'seek_p95_ms': False,
+                    'crop_ms': False, 'display_fps': True, 'export_fps': True}
+
+
+def synth_frame(i, width, height):
+    #Moving gradient with some texture so encoders do real work
+    x = np.arange(width, dtype=np.uint16)
+    y = np.arange(height, dtype=np.uint16)[:, None]
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:, :, 0] = (x + 4 * i) % 256
+    frame[:, :, 1] = (y + 2 * i) % 256
+    frame[:, :, 2] = ((x // 8 + y // 8 + i) % 2) * 255
+    cv2.putText(frame, str(i), (width // 4, height // 2), cv2.FONT_HERSHEY_SIMPLEX, height / 200, (255, 255, 255), 3)
+    return frame
+
+
+def make_video(path, width, height, codec, gop, frames, fps=25):
+    if codec == 'h264':
+        with av.open(path, 'w') as container:
+            stream = container.add_stream('libx264', rate=fps)
+            stream.width = width
+            stream.height = height
+            stream.pix_fmt = 'yuv420p'
+            stream.codec_context.options = {'g': str(gop), 'keyint_min': str(gop)}
+            for i in range(frames):
+                frame = av.VideoFrame.from_ndarray(synth_frame(i, width, height), format='bgr24')
+                for packet in stream.encode(frame):
+                    container.mux(packet)
+            for packet in stream.encode():
+                container.mux(packet)
+    else:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+        for i in range(frames):
+            writer.write(synth_frame(i, width, height))
+        writer.release()
+
+
+def test_videos(workdir, frames, large=False):
+    videos = []
+    for name, width, height, codec, gop in VIDEOS + (LARGE_VIDEOS if large else []):
+        if codec == 'h264' and av is None:
+            print('Skipping {} (needs PyAV)'.format(name))
+            continue
+        ext = '.avi' if codec == 'MJPG' else '.mp4'
+        path = os.path.join(workdir, '{}_{}f{}'.format(name, frames, ext))
+        if not os.path.exists(path):
+            print('Making ' + path)
+            make_video(path, width, height, codec, gop, frames)
+        videos.append((name, path))
+    return videos
+
+
+def open_reader(path):
+    #Uncached so every read is measured, no raw store so frames are decoded
+    readvid = ReadCropVideo(filename=path, cache_mb=0, build_index=False, use_raw=False)
+    if can_index():
+        from frameindex import FrameIndex
+        readvid.set_index(FrameIndex.build(path))
+    return readvid
+
+
+def bench_sequential(path):
+    readvid = open_reader(path)
+    t0 = time.perf_counter()
+    count = sum(1 for _ in readvid.iter_frames(0, readvid.num_frames))
+    seconds = time.perf_counter() - t0
+    readvid.close()
+    return {'sequential_fps': count / seconds}
+
+
+def bench_seek(path, seeks=30):
+    readvid = open_reader(path)
+    rng = random.Random(0)
+    times = []
+    for n in [rng.randrange(readvid.num_frames) for i in range(seeks)]:
+        t0 = time.perf_counter()
+        readvid.read_frame(n=n, cache=False)
+        times.append(1000 * (time.perf_counter() - t0))
+    readvid.close()
+    return {'seek_p50_ms': float(np.percentile(times, 50)), 'seek_p95_ms': float(np.percentile(times, 95))}
+
+
+def bench_crop(path, repeats=1000):
+    #Cost of cropping a decoded frame to a central half size ROI
+    readvid = open_reader(path)
+    w, h = readvid.width, readvid.height
+    readvid.read_uncropped(n=0)
+    readvid.cache.set_budget(1024)
+    readvid.read_uncropped(n=0)
+    readvid.set_crop(((w // 4, 3 * w // 4), (h // 4, 3 * h // 4)))
+    t0 = time.perf_counter()
+    for i in range(repeats):
+        np.ascontiguousarray(readvid.read_frame(n=0))
+    seconds = time.perf_counter() - t0
+    readvid.close()
+    return {'crop_ms': 1000 * seconds / repeats}
+
+
+def bench_display(path, frames=50):
+    from PyQt5.QtWidgets import QApplication
+    from pyqt_widgets import QtImageViewer
+    app = QApplication.instance() or QApplication(sys.argv)
+    readvid = open_reader(path)
+    images = [readvid.read_frame(n=i, cache=False) for i in range(min(frames, readvid.num_frames))]
+    readvid.close()
+    viewer = QtImageViewer()
+    viewer.resize(1024, 720)
+    viewer.show()
+    t0 = time.perf_counter()
+    for image in images:
+        viewer.setImage(image)
+        viewer.viewport().repaint()
+    seconds = time.perf_counter() - t0
+    viewer.close()
+    return {'display_fps': len(images) / seconds}
+
+
+def bench_export(path, workdir):
+    readvid = open_reader(path)
+    w, h = readvid.width, readvid.height
+    job = ExportJob(path, os.path.join(workdir, 'export.mp4'), ((0, w // 2), (0, h // 2)),
+                    0, readvid.num_frames, 1, index=readvid.index)
+    readvid.close()
+    t0 = time.perf_counter()
+    job.run()
+    seconds = time.perf_counter() - t0
+    os.remove(job.output)
+    return {'export_fps': job.done / seconds}
+
+
+def best(a, b):
+    #Best of two runs of the same benchmarks, which filters out most noise
+    return {metric: (max if HIGHER_IS_BETTER[metric] else min)(a[metric], b[metric]) for metric in a}
+
+
+def run(workdir, frames, large=False, repeat=3):
+    results = {}
+    for name, path in test_videos(workdir, frames, large=large):
+        print('Benchmarking ' + name)
+        metrics = None
+        for i in range(repeat):
+            run_metrics = {}
+            run_metrics.update(bench_sequential(path))
+            run_metrics.update(bench_seek(path))
+            run_metrics.update(bench_crop(path))
+            run_metrics.update(bench_display(path))
+            run_metrics.update(bench_export(path, workdir))
+            metrics = run_metrics if metrics is None else best(metrics, run_metrics)
+        for metric, value in metrics.items():
+            results['{}/{}'.format(name, metric)] = value
+    return {'meta': {'python': platform.python_version(), 'opencv': cv2.__version__,
+                     'numpy': np.__version__, 'platform': platform.platform(),
+                     'frames': frames, 'repeat': repeat, 'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+            'results': results}
+
+
+def compare(current, baseline, threshold):
+    #Returns the metrics that got worse by more than threshold (a fraction)
+    regressions = []
+    for key, value in sorted(current['results'].items()):
+        if key not in baseline['results']:
+            continue
+        old = baseline['results'][key]
+        metric = key.split('/')[-1]
+        if HIGHER_IS_BETTER[metric]:
+            change = (old - value) / old
+        else:
+            change = (value - old) / old
+        status = 'REGRESSION' if change > threshold else ''
+        print('{:<36} {:>10.2f} {:>10.2f} {:>+7.1%} {}'.format(key, old, value, -change, status))
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark reading, seeking, cropping, display and export.')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'viewer_bench'),
+                        help='where test videos are made and kept')
+    parser.add_argument('--frames', type=int, default=300, help='frames per test video')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each benchmark, the best is kept')
+    parser.add_argument('--large', action='store_true', help='include 4K videos')
+    parser.add_argument('--output', default='benchmark_results.json', help='results JSON file')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='compare the results against the baseline')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='fractional slow down counted as a regression (default 0.15)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = run(args.workdir, args.frames, large=args.large, repeat=args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Results written to ' + args.output)
+    for key, value in sorted(results['results'].items()):
+        print('{:<36} {:>10.2f}'.format(key, value))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Baseline saved to ' + args.baseline)
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print('{:<36} {:>10} {:>10} {:>7}'.format('metric', 'baseline', 'now', 'change'))
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('{} regression(s) beyond {:.0%}'.format(len(regressions), args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
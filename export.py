@@ -0,0 +1,243 @@
+import os
+import queue
+import threading
+import time
+
+from labvision.video import WriteVideo
+from readcropvid import ReadCropVideo
+from rawstore import RawFrameStore, RawStoreWriter
+import writers
+
+
+#Marks the end of the frames on the queue between decode and encode
+_END = object()
+
+
+class ExportJob:
+    """
+    Writes the cropped frames range(start, stop, step) of a video to output.
+
+    Decoding runs on its own thread and hands frames to the encoder
+    through a bounded queue so the two overlap without decoded frames
+    piling up in memory. The job opens its own reader so the viewer can
+    keep using its one. cancel() stops the job and the partially written
+    file is removed. crop_vals of None writes whole frames.
+
+    output ending .png or .tif writes an image sequence, .npy one memory
+    mapped array and .h5 a compressed HDF5 dataset (see writers), any
+    other extension a video.
+    """
+    remove_partial = True
+    use_raw = True
+
+    def __init__(self, filename, output, crop_vals, start, stop, step=1, index=None, queue_size=32):
+        self.filename = filename
+        self.output = output
+        self.crop_vals = crop_vals
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.index = index
+        self.queue_size = queue_size
+        self.total = len(range(start, stop, step))
+        self.done = 0
+        self.fps = 0.0
+        self.status = 'queued'
+        self.error = None
+        self.frame_rate = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _put(self, frames, item):
+        #Blocks while the queue is full but gives up if cancelled
+        while not self._cancel.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _decode(self, reader, frames):
+        try:
+            for frame in reader.iter_frames(self.start, self.stop, self.step):
+                if not self._put(frames, frame):
+                    return
+        except Exception as e:
+            self._put(frames, e)
+            return
+        self._put(frames, _END)
+
+    def make_writer(self, frame):
+        writer = writers.make_writer(self.output, frame, self.total, self.start, self.step,
+                                     attrs={'source': self.filename, 'start': self.start, 'step': self.step,
+                                            'fps': self.frame_rate})
+        if writer is None:
+            writer = WriteVideo(self.output, frame=frame)
+        return writer
+
+    def run(self, progress=None):
+        #Runs the export in the calling thread. progress(job) is called
+        #about ten times a second and once at the end.
+        self.status = 'running'
+        reader = ReadCropVideo(filename=self.filename, cache_mb=0, build_index=False, use_raw=self.use_raw)
+        reader.index = self.index
+        if self.crop_vals is not None:
+            reader.set_crop(self.crop_vals)
+        self.frame_rate = reader.fps
+        frames = queue.Queue(maxsize=self.queue_size)
+        decoder = threading.Thread(target=self._decode, args=(reader, frames), daemon=True)
+        writer = None
+        t0 = time.perf_counter()
+        last_report = t0
+        try:
+            decoder.start()
+            while not self._cancel.is_set():
+                try:
+                    frame = frames.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if frame is _END:
+                    break
+                if isinstance(frame, Exception):
+                    raise frame
+                if writer is None:
+                    writer = self.make_writer(frame)
+                writer.add_frame(frame)
+                self.done += 1
+                now = time.perf_counter()
+                self.fps = self.done / (now - t0)
+                if progress is not None and now - last_report > 0.1:
+                    last_report = now
+                    progress(self)
+        except Exception as e:
+            #Also stops the decoder
+            self.error = e
+            self._cancel.set()
+        finally:
+            decoder.join()
+            reader.close()
+            if writer is not None:
+                try:
+                    #Finishes frames still being encoded
+                    writer.close()
+                except Exception as e:
+                    self.error = self.error or e
+
+
+        if self.error is not None:
+            self.status = 'failed'
+        elif self.cancelled:
+            self.status = 'cancelled'
+        else:
+            self.status = 'done'
+        if self.status != 'done' and self.remove_partial:
+            if hasattr(writer, 'remove'):
+                writer.remove()
+            elif os.path.exists(self.output):
+                os.remove(self.output)
+        if progress is not None:
+            progress(self)
+        return self.status
+
+
+class UnpackJob(ExportJob):
+    """
+    Unpacks video frames range(start, stop, step) into a RawFrameStore at
+    output, through the same decode/write pipeline and queue as exports.
+    Frames are uncropped since cropping a store is just a view. Cancelled
+    or interrupted unpacks keep what they wrote and carry on from there
+    when run again.
+    """
+    remove_partial = False
+    use_raw = False
+
+    def __init__(self, filename, output, start, stop, step=1, index=None, chunk=64):
+        super().__init__(filename, output, None, start, stop, step, index=index)
+        self.first = start
+        self.count = self.total
+        self.chunk = chunk
+        self.resumed = 0
+
+    def run(self, progress=None):
+        try:
+            store = RawFrameStore(self.output)
+            if store.matches(self.filename, self.first, self.step, self.count):
+                self.resumed = store.done
+        except (OSError, ValueError):
+            pass
+        self.start = self.first + self.resumed * self.step
+        self.total = self.count - self.resumed
+        return super().run(progress=progress)
+
+    def make_writer(self, frame):
+        store = RawFrameStore.create(self.output, (self.count,) + frame.shape, frame.dtype,
+                                     self.filename, self.first, self.step)
+        return RawStoreWriter(store, done=self.resumed, chunk=self.chunk)
+
+
+class ExportQueue:
+    """
+    Runs ExportJobs one after another on a background thread so several
+    exports can be queued while the viewer stays responsive. progress and
+    finished are called with the job from the worker thread.
+    """
+
+    def __init__(self, progress=None, finished=None):
+        self.progress = progress
+        self.finished = finished
+        self.current = None
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        self._jobs.put(job)
+        return job
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def cancel_current(self):
+        job = self.current
+        if job is not None:
+            job.cancel()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            self.current = job
+            if job.cancelled:
+                job.status = 'cancelled'
+            else:
+                try:
+                    job.run(progress=self.progress)
+                except Exception as e:
+                    #Could not even open the video
+                    job.error = e
+                    job.status = 'failed'
+                if job.error is not None:
+                    print('Export of {} failed: {}'.format(job.output, job.error))
+            self.current = None
+            if self.finished is not None:
+                self.finished(job)
+
+    def close(self):
+        #Cancels whatever is running and anything still queued
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.cancel()
+        self.cancel_current()
+        self._jobs.put(None)
@@ -0,0 +1,49 @@
+import glob
+import hashlib
+import os
+
+import numpy as np
+
+
+def cache_dir():
+    #Per user cache directory for data derived from video files.
+    #Follows XDG so nothing is written next to videos on shared storage.
+    base = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, 'viewer')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def is_pattern(path):
+    #A glob pattern for an image sequence. Names of existing files such
+    #as run[1].avi are taken as they are even though they contain [ * or ?.
+    return glob.has_magic(path) and not os.path.exists(path)
+
+
+def file_key(filename):
+    #Identifies a file by name, size and modification time so cached
+    #data is ignored once the file is changed or replaced. An HDF5
+    #dataset (file.h5::/dataset) is keyed by its file and an image
+    #sequence pattern by its directory, with the name telling them apart.
+    path = filename.partition('::')[0]
+    if is_pattern(path):
+        path = os.path.dirname(path) or '.'
+    st = os.stat(path)
+    ident = '{}:{}:{}'.format(os.path.basename(filename), st.st_size, st.st_mtime_ns)
+    return hashlib.sha1(ident.encode()).hexdigest()
+
+
+def cache_path(filename, suffix):
+    return os.path.join(cache_dir(), file_key(filename) + suffix)
+
+
+def open_npy(path, shape, dtype):
+    #Memory map an .npy cache file, reopening an existing one of the right
+    #shape so work saved by an earlier run is kept, otherwise starting anew.
+    try:
+        arr = np.lib.format.open_memmap(path, mode='r+')
+        if arr.shape == tuple(shape) and arr.dtype == dtype:
+            return arr
+    except (OSError, ValueError):
+        pass
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
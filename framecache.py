@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """
+    Least recently used store of decoded frames keyed by frame number.
+
+    Size is limited by memory rather than number of entries so the
+    same budget holds whether frames are small crops or 4K images.
+    Once the stored frames exceed max_mb the least recently used
+    frames are dropped until it fits again. All methods are safe to
+    call from the prefetch threads.
+    """
+
+    def __init__(self, max_mb=1024):
+        self._frames = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.set_budget(max_mb)
+
+    def set_budget(self, max_mb):
+        #A budget of 0 disables caching altogether.
+        with self._lock:
+            self.max_bytes = int(max_mb * 1024 * 1024)
+            self._evict()
+
+    def get(self, n):
+        with self._lock:
+            frame = self._frames.get(n)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(n)
+            self.hits += 1
+            return frame
+
+    def put(self, n, frame):
+        if frame.nbytes > self.max_bytes:
+            return
+        #Frames are shared with every caller that hits the cache
+        #so stop anyone modifying them in place.
+        frame.flags.writeable = False
+        with self._lock:
+            if n in self._frames:
+                self.nbytes -= self._frames.pop(n).nbytes
+            self._frames[n] = frame
+            self.nbytes += frame.nbytes
+            self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._frames:
+            _, frame = self._frames.popitem(last=False)
+            self.nbytes -= frame.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'frames': len(self._frames),
+                    'mb': self.nbytes / (1024 * 1024),
+                    'max_mb': self.max_bytes / (1024 * 1024)}
+
+    def __contains__(self, n):
+        return n in self._frames
+
+    def __len__(self):
+        return len(self._frames)
@@ -0,0 +1,140 @@
+import importlib.util
+import os
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+
+from filecache import cache_dir, cache_path
+
+
+class FrameIndex:
+    """
+    Presentation times and keyframe positions of every frame in a video.
+
+    times holds the presentation time in seconds of each frame in display
+    order, measured from the first frame. keyframes holds the frame numbers
+    of the keyframes, which are the only places a decoder can start from.
+    Built by demuxing the file without decoding it, so it is exact even for
+    variable frame rate files where frame number * fps is not.
+    """
+
+    def __init__(self, times, keyframes):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+
+    @property
+    def num_frames(self):
+        return len(self.times)
+
+    def keyframe_before(self, n):
+        #Last keyframe at or before frame n
+        i = np.searchsorted(self.keyframes, n, side='right') - 1
+        return int(self.keyframes[max(i, 0)])
+
+    def time_of(self, n):
+        return float(self.times[n])
+
+    def frame_at(self, t):
+        #Frame number whose presentation time is nearest t seconds
+        i = int(np.searchsorted(self.times, t))
+        if i > 0 and (i == len(self.times) or t - self.times[i - 1] < self.times[i] - t):
+            i -= 1
+        return i
+
+    @classmethod
+    def build(cls, filename):
+        #PyAV takes longer to import than the viewer takes to show a frame,
+        #so it is only imported once an index is built.
+        try:
+            import av
+        except ImportError:
+            raise ImportError('Building a frame index requires PyAV (pip install av)')
+        with av.open(filename) as container:
+            stream = container.streams.video[0]
+            pts = []
+            key = []
+            for packet in container.demux(stream):
+                #The final flush packet carries no data
+                ts = packet.pts if packet.pts is not None else packet.dts
+                if ts is None:
+                    continue
+                pts.append(ts)
+                key.append(packet.is_keyframe)
+            time_base = float(stream.time_base)
+        if not pts:
+            raise ValueError('No timestamps found in ' + filename)
+        pts = np.array(pts, dtype=np.int64)
+        key = np.array(key, dtype=bool)
+        #Packets arrive in decode order, sort them into display order
+        order = np.argsort(pts, kind='stable')
+        pts = pts[order]
+        times = (pts - pts[0]) * time_base
+        keyframes = np.flatnonzero(key[order])
+        if len(keyframes) == 0 or keyframes[0] != 0:
+            keyframes = np.concatenate(([0], keyframes))
+        return cls(times, keyframes)
+
+    def save(self, filename):
+        #Write to a file of our own then rename so other viewers never load
+        #a partial file, even when several index the same video at once
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=cache_dir())
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, times=self.times, keyframes=self.keyframes)
+            os.replace(tmp, filename)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, filename):
+        data = np.load(filename)
+        return cls(data['times'], data['keyframes'])
+
+
+def index_path(filename):
+    return cache_path(filename, '.index.npz')
+
+
+def load_index(filename):
+    #Cached index for filename or None if it has not been built yet. A
+    #damaged one is deleted so it gets built again.
+    path = index_path(filename)
+    try:
+        return FrameIndex.load(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def can_index():
+    return importlib.util.find_spec('av') is not None
+
+
+class IndexBuilder(threading.Thread):
+    """
+    Builds and caches the FrameIndex for a file on a background thread
+    then passes it to callback. Failures are reported and pass None,
+    leaving the reader seeking by frame number as before.
+    """
+
+    def __init__(self, filename, callback):
+        super().__init__(daemon=True)
+        self.filename = filename
+        self.callback = callback
+
+    def run(self):
+        try:
+            index = FrameIndex.build(self.filename)
+            index.save(index_path(self.filename))
+        except Exception as e:
+            print('Could not index {}: {}'.format(self.filename, e))
+            index = None
+        self.callback(index)
@@ -0,0 +1,224 @@
+import glob
+import os
+import re
+
+import cv2
+import numpy as np
+
+from filecache import is_pattern
+from rawstore import RawFrameStore
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+#Separates an HDF5 file from the dataset in it, e.g. run1.h5::/camera/frames
+DATASET_SEP = '::'
+
+
+class FrameSource:
+    """
+    Random access frames that are not in a video. The optional readers
+    (tifffile, h5py) are imported when a source needing them is opened,
+    so opening a video never pays for them. Subclasses set
+    num_frames, width, height and fps and read(n) returns frame n. mapped
+    is True where frames are views of a memory mapped file, so reading
+    one costs no more than touching its pages and they are not cached.
+    """
+    mapped = False
+    fps = 25.0
+
+    def _set_size(self, frame):
+        self.height, self.width = frame.shape[:2]
+
+    def read(self, n):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def as_uint8(frame):
+    '''
+    frame as 8 bit grey or 3 channel colour for the thumbnail and proxy
+    stores. Source frames keep their stored type, so other integer types
+    are scaled down from their full range and floats from the frame's
+    own range. An alpha channel is dropped.
+    '''
+    if frame.ndim == 3 and frame.shape[2] == 4:
+        frame = frame[:, :, :3]
+    elif frame.ndim == 3 and frame.shape[2] == 1:
+        frame = frame[:, :, 0]
+    if frame.dtype == np.uint8:
+        return frame
+    if np.issubdtype(frame.dtype, np.integer):
+        info = np.iinfo(frame.dtype)
+        lo, hi = info.min, info.max
+    else:
+        lo, hi = float(np.nanmin(frame)), float(np.nanmax(frame))
+    scale = 255.0 / max(hi - lo, 1e-12)
+    return np.clip((frame.astype(np.float32) - lo) * scale, 0, 255).astype(np.uint8)
+
+
+def _natural_key(path):
+    #Sorts img_2.png before img_10.png
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path)]
+
+
+class ImageSequenceSource(FrameSource):
+    #Numbered image files, given as a directory or a glob pattern
+    def __init__(self, filename):
+        if os.path.isdir(filename):
+            paths = [os.path.join(filename, name) for name in os.listdir(filename)
+                     if name.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            paths = glob.glob(filename)
+        self.paths = sorted(paths, key=_natural_key)
+        if not self.paths:
+            raise FileNotFoundError('No images found for ' + filename)
+        self.num_frames = len(self.paths)
+        self._set_size(self.read(0))
+
+    def read(self, n):
+        frame = cv2.imread(self.paths[n], cv2.IMREAD_UNCHANGED)
+        if frame is None:
+            raise IOError('Cannot read ' + self.paths[n])
+        return frame
+
+
+def _frames_view(array):
+    #View of an array as (frames, height, width[, samples]), treating
+    #every leading axis (e.g. time and z) as frames.
+    samples = array.ndim >= 3 and array.shape[-1] in (3, 4)
+    image_dims = 3 if samples else 2
+    if array.ndim == image_dims:
+        return array[None]
+    return array.reshape((-1,) + array.shape[-image_dims:])
+
+
+class TiffStackSource(FrameSource):
+    """
+    Multi-page TIFF. Uncompressed stacks stored contiguously (as most
+    camera software and ImageJ write them) are memory mapped, otherwise
+    each frame is read from its own page's strips or tiles.
+    """
+
+    def __init__(self, filename):
+        try:
+            import tifffile
+        except ImportError:
+            raise ImportError('Reading TIFF stacks needs tifffile')
+        self.tif = None
+        try:
+            self.frames = _frames_view(tifffile.memmap(filename, mode='r'))
+            self.mapped = True
+            self.num_frames = len(self.frames)
+        except ValueError:
+            self.tif = tifffile.TiffFile(filename)
+            self.num_frames = len(self.tif.pages)
+        self._set_size(self.read(0))
+
+    def read(self, n):
+        if self.mapped:
+            return np.asarray(self.frames[n])
+        return self.tif.pages[n].asarray()
+
+    def close(self):
+        if self.tif is not None:
+            self.tif.close()
+
+
+class HDF5Source(FrameSource):
+    """
+    A dataset in an HDF5 file, named as file.h5::/path/to/dataset or else
+    the first dataset of three or more dimensions. Reading a frame only
+    reads the chunks holding it. A dataset attribute 'fps' is used if set.
+    """
+
+    def __init__(self, filename):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('Reading HDF5 needs h5py')
+        path, _, name = filename.partition(DATASET_SEP)
+        self.file = h5py.File(path, 'r')
+        if name:
+            self.dataset = self.file[name]
+        else:
+            found = []
+            self.file.visititems(lambda key, obj: found.append(obj)
+                                 if isinstance(obj, h5py.Dataset) and obj.ndim >= 3 else None)
+            if not found:
+                self.file.close()
+                raise ValueError('No image dataset in ' + path)
+            self.dataset = found[0]
+        self.num_frames = self.dataset.shape[0]
+        self.fps = float(self.dataset.attrs.get('fps', self.fps))
+        self._set_size(self.read(0))
+
+    def read(self, n):
+        return self.dataset[n]
+
+    def close(self):
+        self.file.close()
+
+
+class NpySource(FrameSource):
+    #(frames, height, width[, channels]) .npy file, memory mapped
+    mapped = True
+
+    def __init__(self, filename):
+        self.frames = _frames_view(np.load(filename, mmap_mode='r'))
+        self.num_frames = len(self.frames)
+        self._set_size(self.read(0))
+
+    def read(self, n):
+        return np.asarray(self.frames[n])
+
+
+class RawStoreSource(FrameSource):
+    #The frames of a RawFrameStore opened directly, frame i being store frame i
+    mapped = True
+
+    def __init__(self, filename):
+        self.store = RawFrameStore(filename)
+        self.num_frames = self.store.done
+        self._set_size(self.read(0))
+
+    def read(self, n):
+        return np.asarray(self.store.frames[n])
+
+
+def sequence_pattern(filename):
+    '''
+    Glob pattern for the sequence a numbered image such as img_0001.png
+    belongs to, so picking one image in a file dialog opens them all.
+    Other files, and images with no numbered siblings, are returned as
+    they are.
+    '''
+    folder, name = os.path.split(filename)
+    stem, ext = os.path.splitext(name)
+    match = re.match(r'(.*?)\d+$', stem)
+    if match is None or ext.lower() not in IMAGE_EXTENSIONS or not os.path.isfile(filename):
+        return filename
+    pattern = os.path.join(glob.escape(folder), glob.escape(match.group(1)) + '[0-9]*' + ext)
+    if len(glob.glob(pattern)) < 2:
+        return filename
+    return pattern
+
+
+def open_source(filename):
+    #FrameSource for filename, or None if it should be read as a video
+    if filename is None:
+        return None
+    path = filename.partition(DATASET_SEP)[0]
+    name = path.lower()
+    if os.path.isdir(filename) or is_pattern(path):
+        return ImageSequenceSource(filename)
+    if name.endswith(('.tif', '.tiff')):
+        return TiffStackSource(filename)
+    if name.endswith(('.h5', '.hdf5', '.hdf')):
+        return HDF5Source(filename)
+    if name.endswith('.npy'):
+        return NpySource(filename)
+    if name.endswith('.raw'):
+        return RawStoreSource(filename)
+    return None
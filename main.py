@@ -1,35 +1,112 @@
-from pyqt_widgets import QtImageViewer, Spinbox_Slider
-from labvision.images import hstack
-from readcropvid import ReadCropVideo
-from labvision.video import WriteVideo
-from labvision.images import save
+#perf first so its clock starts with the viewer, see perf.first_frame
+import perf
+from pyqt_widgets import QtImageViewer, Spinbox_Slider, ExportProgress, Filmstrip, TimeSeriesPlot
+from scheduler import FrameScheduler
 from crop import SelectAreaWidget
 import sys
+import threading
+import time
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import (QApplication, QHBoxLayout,
-                                 QWidget,
-                                 QVBoxLayout, QAction, QPushButton, QFileDialog)
+                                 QWidget, QComboBox, QLabel,
+                                 QVBoxLayout, QAction, QPushButton, QFileDialog, QInputDialog, QShortcut)
 
 
 import os
 
-
+#Reading, decoding (cv2, labvision) and the background jobs are imported
+#in the methods using them, so the file dialog is up without waiting for them.
 
 
 class MainWindow(QtImageViewer):
-    def __init__(self, filename=None):
+    # Emitted from the decode thread with (frame number, image).
+    frameDecoded = pyqtSignal(int, object)
+    # Emitted from an index builder with the reader whose frame count is now exact.
+    indexReady = pyqtSignal(object)
+
+    def __init__(self, filename=None, prefetch_depth=8, prefetch_workers=1, proxy_factor=None, idle_ms=150, live_fps=30,
+                 thumbnail_workers=2, playback_ring=8, offsets=None, roi_workers=4, activity_workers=2,
+                 activity_threshold=None):
 
         app = QApplication(sys.argv)
         super().__init__()
+        #filename can be a list of videos to view side by side, video i
+        #showing frame n + offsets[i] at frame n of the slider.
+        self.offsets = offsets
+        self.streams = None
+        self.prefetchers = []
+        #Set once the work load_vid leaves until frame 0 is up has started
+        self._background_loaded = True
+        #Number of frames decoded ahead of the current one and
+        #number of background decoding threads doing it.
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_workers = prefetch_workers
+        #If proxy_factor is set a reduced resolution proxy is built and shown
+        #while scrubbing, switching to full resolution after idle_ms without input.
+        self.proxy_factor = proxy_factor
+        self.idle_timer = QTimer()
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(idle_ms)
+        self.idle_timer.timeout.connect(lambda: self.load_frame())
+        #Frames not already decoded are read on a worker that only ever
+        #decodes the newest request. Dragging the slider updates the
+        #view at no more than live_fps.
+        self.scheduler = FrameScheduler(self._decode_frame, self.frameDecoded.emit)
+        self.frameDecoded.connect(self._show_decoded)
+        self.indexReady.connect(self._index_ready)
+        self.live_fps = live_fps
+        self._last_live = 0
+        self.live_timer = QTimer()
+        self.live_timer.setSingleShot(True)
+        self.live_timer.timeout.connect(self._live_update)
+        #Worker processes making the filmstrip thumbnails
+        self.thumbnail_workers = thumbnail_workers
+        self.thumbnail_builder = None
+        #Playback decodes up to playback_ring frames ahead on its own thread
+        self.playback_ring = playback_ring
+        self.player = None
+        self.play_timer = QTimer()
+        self.play_timer.setTimerType(Qt.PreciseTimer)
+        self.play_timer.timeout.connect(self._play_tick)
+        #Worker processes measuring ROI intensities
+        self.roi_workers = roi_workers
+        self.roi_job = None
+        #Worker processes computing the activity index. N and Shift+N jump
+        #to the next and previous frames where activity rises to
+        #activity_threshold, by default worked out from the activity itself.
+        self.activity_workers = activity_workers
+        self.activity_threshold = activity_threshold
+        self.activity_builder = None
         if filename is None:
             home = os.getenv("HOME")
-            filename, _ = QFileDialog.getOpenFileName(self, "", home + "/Videos/")
-        self.filename=filename
+            filename, _ = QFileDialog.getOpenFileNames(self, "", home + "/Videos/")
+            #Picking one numbered image opens the whole sequence
+            from framesources import sequence_pattern
+            filename = [sequence_pattern(name) for name in filename]
+        self.filenames = list(filename) if isinstance(filename, (list, tuple)) else [filename]
+        self.filename = self.filenames[0]
         self.setup_main_window()
         self.load_vid()
 
-        sys.exit(app.exec_())
+        ret = app.exec_()
+        self.shutdown()
+        sys.exit(ret)
+
+    def shutdown(self):
+        #Stop background work before the interpreter exits
+        self.stop_playback()
+        self.cancel_rois()
+        if self.activity_builder is not None:
+            self.activity_builder.stop()
+        if self.thumbnail_builder is not None:
+            self.thumbnail_builder.stop()
+        self.export_queue.close()
+        self.scheduler.close()
+        for prefetcher in self.prefetchers:
+            prefetcher.close()
+        self.streams.close()
 
 
     def setup_main_window(self):
@@ -40,20 +117,48 @@ class MainWindow(QtImageViewer):
         self.vbox = QVBoxLayout(self.win)
 
 
-        # Create Image viewer
+        # Create Image viewer with the ROI plot beside it
         self.viewer_setup()
-        self.vbox.addWidget(self.viewer)
-        self.framenum_slider = Spinbox_Slider(self.win, 'frame number', self.slider_update, min=0, max=1, step=1)
+        self.roi_plot = TimeSeriesPlot(self.save_rois, self.cancel_rois)
+        self.roi_plot.frameSelected.connect(self.slider_update)
+        self.roi_plot.hide()
+        viewer_box = QHBoxLayout()
+        viewer_box.addWidget(self.viewer, 3)
+        viewer_box.addWidget(self.roi_plot, 2)
+        self.vbox.addLayout(viewer_box)
+        self.filmstrip = Filmstrip()
+        self.filmstrip.frameSelected.connect(self.slider_update)
+        self.vbox.addWidget(self.filmstrip)
+        self.framenum_slider = Spinbox_Slider(self.win, 'frame number', self.slider_update, min=0, max=1, step=1,
+                                              live_update_fn=self.slider_moved, activity_bar=True)
+        QShortcut(QKeySequence('N'), self.win, self.next_event)
+        QShortcut(QKeySequence('Shift+N'), self.win, self.previous_event)
         self.crop_button = QPushButton('Crop')
         self.reset_crop_button = QPushButton('Reset')
         self.save_img_button = QPushButton('Save Img')
         self.saveas_button = QPushButton('Save Vid')
-        self.load_vid()
-        self.framenum_slider.vid_end=self.readvid.num_frames - 1
-        self.framenum_slider.set_slider_range(0,self.readvid.num_frames - 1, 1)
+        self.unpack_button = QPushButton('Unpack')
+        self.offsets_button = QPushButton('Offsets')
+        self.measure_button = QPushButton('Measure')
+        self.activity_button = QPushButton('Activity')
+        self.play_button = QPushButton('Play')
+        self.reverse_button = QPushButton('Rev')
+        self.rate_box = QComboBox()
+        self.rate_box.addItems(['0.25x', '0.5x', '1x', '2x', '4x'])
+        self.rate_box.setCurrentText('1x')
+        self.dropped_label = QLabel()
         hbox = QHBoxLayout()
 
         hbox.addWidget(self.framenum_slider)
+        self.play_button.setCheckable(True)
+        self.play_button.clicked.connect(self.toggle_playback)
+        self.reverse_button.setCheckable(True)
+        self.reverse_button.clicked.connect(lambda x:self._restart_playback())
+        self.rate_box.currentIndexChanged.connect(lambda x:self._restart_playback())
+        hbox.addWidget(self.play_button)
+        hbox.addWidget(self.reverse_button)
+        hbox.addWidget(self.rate_box)
+        hbox.addWidget(self.dropped_label)
         hbox.addWidget(self.crop_button)
         hbox.addWidget(self.reset_crop_button)
         hbox.addWidget(self.save_img_button)
@@ -63,8 +168,24 @@ class MainWindow(QtImageViewer):
         self.save_img_button.clicked.connect(lambda x:self.save_img())
         self.saveas_button.clicked.connect(lambda x:self.save_vid())
         hbox.addWidget(self.saveas_button)
+        self.unpack_button.clicked.connect(lambda x:self.unpack())
+        hbox.addWidget(self.unpack_button)
+        self.measure_button.clicked.connect(lambda x:self.measure_rois())
+        hbox.addWidget(self.measure_button)
+        self.activity_button.clicked.connect(lambda x:self.compute_activity())
+        hbox.addWidget(self.activity_button)
+        self.offsets_button.clicked.connect(lambda x:self.set_offsets())
+        hbox.addWidget(self.offsets_button)
         self.vbox.addLayout(hbox)
 
+        # Exports run in the background one after another
+        from export import ExportQueue
+        self.export_progress = ExportProgress(lambda: self.export_queue.cancel_current())
+        self.export_queue = ExportQueue(progress=self.export_progress.progress.emit,
+                                        finished=self.export_progress.finished.emit)
+        self.export_progress.finished.connect(self._export_finished)
+        self.vbox.addWidget(self.export_progress)
+
         # Finalise window
         self.win.setWindowTitle('ParamGui')
         self.win.setLayout(self.vbox)
@@ -106,10 +227,19 @@ class MainWindow(QtImageViewer):
 
     def _set_crop(self, crop_coords=None):
         if crop_coords is None:
-            self.readvid.reset_crop()
+            for readvid in self.streams.readvids:
+                readvid.reset_crop()
         else:
-            self.readvid.set_crop(crop_coords)
-        self.load_frame()
+            #Crops the video the selection starts in
+            (x0, x1), y = crop_coords
+            i, x = self.streams.stream_at(x0)
+            self.streams.readvids[i].set_crop(((x, x + x1 - x0), y))
+        #Activity is per crop, show the new crop's if it was made before
+        if self._background_loaded:
+            self.load_activity()
+        #While playing the new crop shows from the next frame
+        if self.player is None:
+            self.load_frame()
 
     def viewer_setup(self):
         self.viewer = QtImageViewer()
@@ -117,6 +247,7 @@ class MainWindow(QtImageViewer):
         self.viewer.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         #self.viewer.leftMouseButtonPressed.connect(self.get_coords)
         self.viewer.scrollMouseButton.connect(self._update_frame)
+        self.viewer.imagePainted.connect(self._image_painted)
         self.viewer.canZoom = True
         self.viewer.canPan = True
         self.win.resize(1024, 720)
@@ -140,58 +271,378 @@ class MainWindow(QtImageViewer):
         preferences = menubar.addMenu('&Preferences')
 
     def load_video(self):
-        self.filename=None
+        self.filenames=[None]
         self.load_vid()
 
     def load_vid(self):
-        self.readvid=ReadCropVideo(filename=self.filename)
-        self.filename = self.readvid.filename
+        #The first video is the one exported, played and shown in the
+        #filmstrip. Any others are only viewed alongside it.
+        #Only what is needed to show frame 0 is done here, everything else
+        #starts in _load_background once it is on screen.
+        perf.opened()
+        from readcropvid import ReadCropVideo
+        from multistream import StreamSet
+        self.stop_playback()
+        if self.streams is not None:
+            self.scheduler.cancel()
+            for prefetcher in self.prefetchers:
+                prefetcher.close()
+            self.streams.close()
+        self.streams = StreamSet([ReadCropVideo(filename=filename, build_index=False) for filename in self.filenames],
+                                 self.offsets)
+        self.filenames = [readvid.filename for readvid in self.streams.readvids]
+        self.readvid = self.streams.readvids[0]
+        self.filename = self.filenames[0]
+        #Playback follows one video only
+        self.play_button.setEnabled(len(self.streams) == 1)
+        self.offsets_button.setVisible(len(self.streams) > 1)
+        self.prefetchers = []
+        #The activity of the last video is gone until load_activity runs for this one
+        if self.activity_builder is not None:
+            self.activity_builder.stop()
+            self.activity_builder = None
+        self.framenum_slider.activity.set_store(None)
         self.framenum = 0
-        self.framenum_slider.set_slider_range(0, self.readvid.num_frames -1, 1)
-        self.load_frame()
+        self._set_frame_range(reset=True)
+        self._background_loaded = False
+        self.viewer.setImage(self.streams.read(0))
+        #In case the window is not being painted
+        QTimer.singleShot(1000, self._load_background)
+
+    def _image_painted(self):
+        if not self._background_loaded:
+            QTimer.singleShot(0, self._load_background)
+
+    def _load_background(self):
+        #The frame counts so far are the containers' estimates. Where an
+        #index has to be built the exact count arrives in _index_ready.
+        if self._background_loaded:
+            return
+        self._background_loaded = True
+        counting = [readvid.find_index(ready=self.indexReady.emit) for readvid in self.streams.readvids]
+        self._set_frame_range()
+        if not counting[0]:
+            self._load_stores()
+        from prefetch import FramePrefetcher
+        self.prefetchers = [FramePrefetcher(readvid, depth=self.prefetch_depth, workers=self.prefetch_workers)
+                            for readvid in self.streams.readvids]
+        for i, prefetcher in enumerate(self.prefetchers):
+            n = self.streams.frame_of(i, self.framenum)
+            if n is not None:
+                prefetcher.update(n)
+
+    def _index_ready(self, readvid):
+        if self.streams is None or readvid not in self.streams.readvids:
+            #Index of a video closed since
+            return
+        #Also called when the build failed, so the stores still load
+        self._set_frame_range()
+        if readvid is self.readvid:
+            self._load_stores()
+
+    def _set_frame_range(self, reset=False):
+        #The slider covers the first video. When its frame count changes a
+        #range reaching the end moves to the new end, a narrower one is kept.
+        slider = self.framenum_slider
+        end = self.readvid.num_frames - 1
+        if reset:
+            start, stop, step = 0, end, 1
+        else:
+            start, step = slider.min, slider.step
+            stop = end if slider.max >= slider.vid_end else min(slider.max, end)
+        slider.vid_end = end
+        slider.set_slider_range(start, stop, step)
+
+    def _load_stores(self):
+        #Proxy, thumbnails and activity are sized by the frame count so
+        #wait for it to be exact
+        if self.proxy_factor:
+            self.readvid.start_proxy(factor=self.proxy_factor)
+        self.load_thumbnails()
+        self.load_activity()
+
+    def load_thumbnails(self):
+        from thumbnails import ThumbnailStore, ThumbnailBuilder
+        if self.thumbnail_builder is not None:
+            self.thumbnail_builder.stop()
+        store = ThumbnailStore(self.filename, self.readvid.num_frames, self.readvid.width, self.readvid.height)
+        self.filmstrip.set_store(store)
+        if not store.complete():
+            self.thumbnail_builder = ThumbnailBuilder(store, workers=self.thumbnail_workers)
+            self.thumbnail_builder.start()
+
+    def load_activity(self, build=False):
+        #Show the activity index for the current crop if one was made before,
+        #or make it if build is True.
+        from activity import ActivityStore, ActivityBuilder, activity_path
+        if self.activity_builder is not None:
+            self.activity_builder.stop()
+            self.activity_builder = None
+        crop_vals = self.readvid.crop_vals
+        if not build and not os.path.exists(activity_path(self.filename, crop_vals)):
+            #Nothing for this file and crop, so no events from the last one either
+            self.framenum_slider.activity.set_store(None)
+            return
+        store = ActivityStore(self.filename, self.readvid.num_frames, crop_vals)
+        self.framenum_slider.activity.set_store(store, threshold=self.activity_threshold)
+        if build and not store.complete():
+            self.activity_builder = ActivityBuilder(store, workers=self.activity_workers)
+            self.activity_builder.start()
+
+    def compute_activity(self):
+        self.load_activity(build=True)
+
+    def next_event(self):
+        self._jump_to_event(forward=True)
+
+    def previous_event(self):
+        self._jump_to_event(forward=False)
+
+    def _jump_to_event(self, forward):
+        #Only the frame jumped to is read
+        bar = self.framenum_slider.activity
+        if bar.store is None:
+            return
+        find = bar.store.next_event if forward else bar.store.previous_event
+        n = find(self.framenum, bar.current_threshold())
+        if n is not None and self.framenum_slider.min <= n <= self.framenum_slider.max:
+            self.slider_update(n)
 
     def slider_update(self, val):
+        self.stop_playback()
         self.framenum = val
-        self.load_frame()
+        self.load_frame(scrubbing=True)
         self.framenum_slider.set_slider_value(val)
 
+    def slider_moved(self, val):
+        #Live preview while dragging, limited to live_fps. Requests in
+        #between are not queued, the timer shows wherever the slider is.
+        self.stop_playback()
+        self.framenum = val
+        wait = self._last_live + 1 / self.live_fps - time.perf_counter()
+        if wait <= 0:
+            self._live_update()
+        elif not self.live_timer.isActive():
+            self.live_timer.start(int(wait * 1000))
+
+    def _live_update(self):
+        self._last_live = time.perf_counter()
+        self.load_frame(scrubbing=True)
+
     def _update_frame(self, wheel_change):
+        self.stop_playback()
         self.framenum = self.framenum + wheel_change
         if self.framenum < 0:
             self.framenum = 0
         elif self.framenum >= (self.readvid.num_frames - 1):
             self.framenum =  (self.readvid.num_frames - 1)
         self.framenum_slider.set_slider_value(self.framenum)
-        self.load_frame()
-
-    def load_frame(self):
-        im = self.readvid.read_frame(n=self.framenum)
-        self.viewer.setImage(im)
+        self.load_frame(scrubbing=True)
+
+    def load_frame(self, scrubbing=False):
+        self.roi_plot.set_frame(self.framenum)
+        #Point the prefetchers at the new position first so they decode
+        #the frames after this one while this one is displayed.
+        for i, prefetcher in enumerate(self.prefetchers):
+            n = self.streams.frame_of(i, self.framenum)
+            if n is not None:
+                prefetcher.update(n)
+        if self.streams.is_decoded(self.framenum):
+            self.scheduler.cancel()
+            self.idle_timer.stop()
+            self.viewer.setImage(self.streams.read(self.framenum))
+            return
+        if scrubbing and len(self.streams) == 1:
+            proxy = self.readvid.read_proxy(self.framenum)
+            if proxy is not None:
+                self.scheduler.cancel()
+                im, offset = proxy
+                self.viewer.setImage(im, scale=self.readvid.proxy.factor, offset=offset,
+                                     size=self.readvid.crop_size())
+                self.idle_timer.start()
+                return
+        self.idle_timer.stop()
+        self.scheduler.request(self.framenum)
+
+    def _decode_frame(self, n):
+        #Runs on the scheduler thread
+        for i, prefetcher in enumerate(self.prefetchers):
+            m = self.streams.frame_of(i, n)
+            if m is not None:
+                prefetcher.wait(m)
+        return self.streams.read(n)
+
+    def _show_decoded(self, n, im):
+        #Frames for earlier requests are shown while catching up, but not
+        #once a cached or proxy frame has been shown in the meantime.
+        if self.scheduler.latest is not None:
+            self.viewer.setImage(im)
+
+    def toggle_playback(self):
+        if self.player is None:
+            self.start_playback()
+        else:
+            self.stop_playback()
+
+    def start_playback(self):
+        '''
+        Play from the current frame to the end of the slider range, or to
+        its start in reverse, visiting every slider step'th frame. Time
+        runs at the rate chosen times the file's own frame rate and frames
+        that can't be shown in time are dropped.
+        '''
+        from playback import Player, playback_frames, frame_rate
+        self.stop_playback()
+        rate = float(self.rate_box.currentText()[:-1])
+        frames = playback_frames(self.framenum, self.framenum_slider.min, self.framenum_slider.max,
+                                 step=self.framenum_slider.step, reverse=self.reverse_button.isChecked())
+        if len(frames) < 2:
+            self.play_button.setChecked(False)
+            return
+        self.scheduler.cancel()
+        self.idle_timer.stop()
+        self.player = Player(self.readvid, frames, rate=rate, ring=self.playback_ring)
+        #Check for a new frame about twice per frame shown
+        frame_ms = 1000 * self.framenum_slider.step / (frame_rate(self.readvid.fps) * rate)
+        self.play_timer.start(max(1, int(frame_ms / 2)))
+        self.play_button.setChecked(True)
+        self.play_button.setText('Pause')
+
+    def stop_playback(self):
+        if self.player is None:
+            return
+        self.play_timer.stop()
+        self.player.stop()
+        self.player = None
+        self.play_button.setChecked(False)
+        self.play_button.setText('Play')
+
+    def _restart_playback(self):
+        #Rate or direction changed while playing
+        if self.player is not None:
+            self.start_playback()
+
+    def _play_tick(self):
+        item = self.player.next_frame()
+        if item is not None:
+            self.framenum, frame = item
+            self.viewer.setImage(self.readvid.crop(frame))
+            self.framenum_slider.set_slider_value(self.framenum)
+            self.dropped_label.setText('dropped {}'.format(self.player.dropped))
+        if self.player.finished:
+            self.stop_playback()
 
     def _display_img(self, *ims):
         if len(ims) == 1:
             self.im = ims[0]
         else:
-            self.im = hstack(*ims)
+            self.im = self.streams.compose(list(ims))
+
+    def set_offsets(self):
+        #Frame offset of each video, comma separated
+        output = ','.join(str(offset) for offset in self.streams.offsets)
+        label = 'offset per video'
+        while True:
+            output, ok = QInputDialog.getText(self.win, 'Frame offsets:', label, text=output)
+            if not ok:
+                return
+            try:
+                offsets = [int(offset) for offset in output.split(',')]
+                break
+            except ValueError as e:
+                label = '{}\noffset per video'.format(e)
+        self.offsets = offsets + [0] * (len(self.streams) - len(offsets))
+        self.streams.offsets = self.offsets[:len(self.streams)]
+        self.load_frame()
+
+    def _slider_range(self):
+        #(start, stop, step) of the slider range for range(), the last
+        #frame of the slider being included as it is in playback
+        return self.framenum_slider.min, self.framenum_slider.max + 1, self.framenum_slider.step
 
     def save_vid(self):
         home = os.getenv("HOME")
-        filename, ext = QFileDialog.getSaveFileName(self, "", home + "/Videos/",self.tr("*.mp4;; *.m4v;; *.avi"))
+        filename, ext = QFileDialog.getSaveFileName(self, "", home + "/Videos/",self.tr("*.mp4;; *.m4v;; *.avi;; *.png;; *.tif;; *.npy;; *.h5"))
+        if filename:
+            from export import ExportJob
+            start, stop, step = self._slider_range()
+            job = ExportJob(self.filename, filename, self.readvid.crop_vals, start, stop, step,
+                            index=self.readvid.index)
+            self.export_progress.add_job()
+            self.export_queue.submit(job)
+
+    def unpack(self):
+        #Unpack the slider range to a raw frame store so it can be
+        #viewed without decoding. Resumes a previous unpack of the range.
+        from export import UnpackJob
+        from rawstore import raw_store_path
+        start, stop, step = self._slider_range()
+        job = UnpackJob(self.filename, raw_store_path(self.filename), start, stop, step, index=self.readvid.index)
+        self.export_progress.add_job()
+        self.export_queue.submit(job)
+
+    def _export_finished(self, job):
+        from export import UnpackJob
+        if isinstance(job, UnpackJob) and job.filename == self.filename and os.path.exists(job.output):
+            self.readvid.attach_raw_store(job.output)
+
+    def measure_rois(self):
+        '''
+        Mean, sum, min and max of each channel inside one or more ROIs for
+        every frame of the slider range, plotted as they are measured.
+        ROIs are entered as x0,x1,y0,y1 separated by ; and start as the crop box.
+        '''
+        (x0, x1), (y0, y1) = self.readvid.crop_vals
+        output = '{},{},{},{}'.format(x0, x1, y0, y1)
+        label = 'x0,x1,y0,y1; ...'
+        while True:
+            output, ok = QInputDialog.getText(self.win, 'Measure ROIs:', label, text=output)
+            if not ok:
+                return
+            try:
+                rois = []
+                for roi in output.split(';'):
+                    x0, x1, y0, y1 = [int(v) for v in roi.split(',')]
+                    rois.append(((x0, x1), (y0, y1)))
+                self.start_rois(rois)
+                return
+            except ValueError as e:
+                #Asked again with what was typed, e.g. a missing number
+                #or a ROI outside the frame
+                label = '{}\nx0,x1,y0,y1; ...'.format(e)
+
+    def start_rois(self, rois):
+        from roistats import RoiJob
+        frame = self.readvid.read_uncropped(n=self.framenum)
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        start, stop, step = self._slider_range()
+        job = RoiJob(self.filename, rois, start, stop, step, channels=channels, workers=self.roi_workers,
+                     size=(frame.shape[1], frame.shape[0]))
+        self.cancel_rois()
+        self.roi_job = job
+        self.roi_plot.set_job(self.roi_job)
+        self.roi_plot.set_frame(self.framenum)
+        threading.Thread(target=self.roi_job.run, args=(self.roi_plot.progress.emit,), daemon=True).start()
+
+    def cancel_rois(self):
+        if self.roi_job is not None:
+            self.roi_job.cancel()
+
+    def save_rois(self):
+        if self.roi_job is None:
+            return
+        home = os.getenv("HOME")
+        filename, ext = QFileDialog.getSaveFileName(self, "", home, self.tr("*.csv;; *.npy"))
         if filename:
-            writevid = WriteVideo(filename, frame=self.readvid.read_frame(n=self.framenum_slider.value))
-            start = self.framenum_slider.min
-            stop =  self.framenum_slider.max
-            step = self.framenum_slider.step
-            for i in range(start, stop, step):
-                img = self.readvid.read_frame(n=i)
-                writevid.add_frame(img)
-            writevid.close()
+            self.roi_job.save(filename)
 
     def save_img(self):
         home = os.getenv("HOME")
         filename, ok = QFileDialog.getSaveFileName(self, "", home + "/Pictures/",self.tr("*.jpg;; *.png;; *.tiff"))
         if filename:
-            img = self.readvid.read_frame(n=self.framenum_slider.value)
+            img = self.streams.read(self.framenum_slider.value)
+            #labvision.images is slow to import and only needed here
+            from labvision.images import save
             save(img, filename)
 
 
@@ -200,4 +651,6 @@ class MainWindow(QtImageViewer):
 
 
 if __name__ == "__main__":
-    main = MainWindow()
+    #Files, image sequence directories or patterns and file.h5::/dataset
+    #paths can be given on the command line, otherwise a dialog asks
+    main = MainWindow(filename=sys.argv[1:] or None)
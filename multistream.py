@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class StreamSet:
+    """
+    Several videos shown side by side and moved together. Frame n of the
+    set is frame n + offsets[i] of video i, each read with its own crop.
+
+    Frames that need decoding are read on one worker per video so a frame
+    of the set takes as long as the slowest video rather than the sum of
+    them. They are copied into a preallocated display buffer; two buffers
+    are used in turn so one can be composed while the other is on screen,
+    and they are only reallocated when a crop changes the layout. A
+    composed frame is only valid until the next but one compose, so
+    anything keeping it longer copies it (see TiledImageItem.setArray).
+    With a single video its cropped frame is returned as it is, with no copy.
+    """
+
+    def __init__(self, readvids, offsets=None):
+        self.readvids = readvids
+        self.offsets = list(offsets) if offsets else []
+        self.offsets += [0] * (len(readvids) - len(self.offsets))
+        self._pool = ThreadPoolExecutor(max_workers=len(readvids)) if len(readvids) > 1 else None
+        self._shapes = None
+        self._buffers = None
+        self._which = 0
+        #compose is called from both the viewer and its decode thread
+        self._lock = threading.Lock()
+        self.slots = []
+
+    def __len__(self):
+        return len(self.readvids)
+
+    def frame_of(self, i, n):
+        #Frame of video i at frame n of the set, or None if it has none
+        m = n + self.offsets[i]
+        if 0 <= m < self.readvids[i].num_frames:
+            return m
+        return None
+
+    def is_decoded(self, n):
+        return all(m is None or readvid.is_decoded(m)
+                   for readvid, m in zip(self.readvids, (self.frame_of(i, n) for i in range(len(self)))))
+
+    def _read(self, i, n):
+        m = self.frame_of(i, n)
+        if m is None:
+            return None
+        return self.readvids[i].read_frame(n=m)
+
+    def read(self, n):
+        #Frame n of the set as one image
+        if self._pool is None:
+            return self._read(0, n)
+        if self.is_decoded(n):
+            frames = [self._read(i, n) for i in range(len(self))]
+        else:
+            frames = list(self._pool.map(self._read, range(len(self)), [n] * len(self)))
+        return self.compose(frames)
+
+    def _layout(self, frames):
+        #(height, width) of each slot, a missing frame taking the size of the crop
+        shapes = []
+        for readvid, frame in zip(self.readvids, frames):
+            if frame is None:
+                w, h = readvid.crop_size()
+                shapes.append((h, w))
+            else:
+                shapes.append(frame.shape[:2])
+        return shapes
+
+    def compose(self, frames):
+        with self._lock:
+            return self._compose(frames)
+
+    def _compose(self, frames):
+        shapes = self._layout(frames)
+        colour = any(frame is not None and frame.ndim == 3 for frame in frames)
+        dtype = next((frame.dtype for frame in frames if frame is not None), np.uint8)
+        key = (tuple(shapes), colour, dtype)
+        if key != self._shapes:
+            height = max(h for h, w in shapes)
+            width = sum(w for h, w in shapes)
+            shape = (height, width, 3) if colour else (height, width)
+            self._buffers = [np.zeros(shape, dtype=dtype), np.zeros(shape, dtype=dtype)]
+            self._shapes = key
+            self.slots = []
+            x = 0
+            for h, w in shapes:
+                self.slots.append((x, x + w))
+                x += w
+        self._which = 1 - self._which
+        buffer = self._buffers[self._which]
+        for (x0, x1), (h, w), frame in zip(self.slots, shapes, frames):
+            if frame is None:
+                buffer[:, x0:x1] = 0
+                continue
+            if colour and frame.ndim == 2:
+                frame = frame[:, :, None]
+            buffer[:h, x0:x1] = frame
+            buffer[h:, x0:x1] = 0
+        return buffer
+
+    def stream_at(self, x):
+        #Video shown at column x of the composed image and x relative to its slot
+        for i, (x0, x1) in enumerate(self.slots):
+            if x0 <= x < x1:
+                return i, x - x0
+        return 0, x
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        for readvid in self.readvids:
+            readvid.close()
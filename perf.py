@@ -0,0 +1,134 @@
+'''
+Lightweight timing of the stages frames go through on their way to the
+screen (decode, crop, conversion, fit, paint).
+
+    with perf.stage('decode'):
+        frame = ...
+
+Timing is off unless perf.enabled is True (or VIEWER_PERF=1 is set in the
+environment). While off, stage() returns a shared do-nothing context
+manager so instrumented code costs one function call. While on, each stage
+keeps its last few hundred durations for rolling percentiles and every
+timed span is kept for dump_trace(), which writes Chrome trace JSON that
+chrome://tracing or Perfetto can open.
+
+Time to first frame is always measured: opened() marks a file being
+opened and the next frame_painted() records how long its first frame
+took to reach the screen, and how long since perf was imported (which
+main does first, so roughly since the viewer started).
+'''
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+
+enabled = os.getenv('VIEWER_PERF', '') not in ('', '0')
+
+WINDOW = 500
+_durations = defaultdict(lambda: deque(maxlen=WINDOW))
+_events = deque(maxlen=200000)
+_shown = deque(maxlen=WINDOW)
+_t0 = time.perf_counter()
+_opened = None
+#(seconds since opened(), seconds since start) for the last file opened
+first_frame = None
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        _durations[self.name].append(end - self.start)
+        _events.append((self.name, self.start, end, threading.get_ident()))
+        return False
+
+
+def stage(name):
+    if not enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def frame_shown():
+    #Call once per frame put on screen, for the effective frame rate
+    if enabled:
+        _shown.append(time.perf_counter())
+
+
+def opened():
+    global _opened
+    _opened = time.perf_counter()
+
+
+def frame_painted():
+    #Call after a frame is painted, records time to first frame once per opened()
+    global _opened, first_frame
+    if _opened is None:
+        return
+    now = time.perf_counter()
+    first_frame = (now - _opened, now - _t0)
+    _opened = None
+    print('First frame in {:.0f} ms ({:.0f} ms since start)'.format(1000 * first_frame[0], 1000 * first_frame[1]))
+
+
+def fps(window=1.0):
+    now = time.perf_counter()
+    return sum(1 for t in _shown if now - t <= window) / window
+
+
+def summary():
+    #{stage: (count, p50, p95, p99)} with times in ms over the last WINDOW samples
+    import numpy as np
+    stats = {}
+    for name, durations in list(_durations.items()):
+        if durations:
+            ms = 1000 * np.array(durations)
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            stats[name] = (len(ms), p50, p95, p99)
+    return stats
+
+
+def report():
+    lines = ['{:.1f} fps'.format(fps())]
+    if first_frame is not None:
+        lines.append('first frame {:.0f} ms'.format(1000 * first_frame[0]))
+    for name, (count, p50, p95, p99) in sorted(summary().items()):
+        lines.append('{:<8} p50 {:6.2f}  p95 {:6.2f}  p99 {:6.2f} ms'.format(name, p50, p95, p99))
+    return '\n'.join(lines)
+
+
+def reset():
+    _durations.clear()
+    _events.clear()
+    _shown.clear()
+
+
+def dump_trace(filename):
+    #Writes the timed spans as Chrome trace events (times in microseconds)
+    events = [{'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+               'ts': (start - _t0) * 1e6, 'dur': (end - start) * 1e6}
+              for name, start, end, tid in list(_events)]
+    with open(filename, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return len(events)
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from readcropvid import ReadCropVideo
+
+
+#Used for files whose container reports no frame rate
+DEFAULT_FPS = 25.0
+
+
+def frame_rate(fps):
+    return fps if fps and fps > 0 else DEFAULT_FPS
+
+
+def playback_frames(start, lo, hi, step=1, reverse=False):
+    #Frame numbers visited playing from start to the end of [lo, hi] (inclusive)
+    start = min(max(start, lo), hi)
+    if reverse:
+        return np.arange(start, lo - 1, -step)
+    return np.arange(start, hi + 1, step)
+
+
+class PlaybackClock:
+    """
+    When each frame of a playback is due on screen. frames are played in
+    the order given, frame i being shown (time of frame i - time of frame
+    0) / rate seconds after start(). Times come from the frame index so
+    variable frame rate files play at the right speed, or from the frame
+    rate if there is no index.
+    """
+
+    def __init__(self, frames, fps, index=None, rate=1.0):
+        self.frames = frames
+        if index is not None:
+            times = index.times[frames]
+        else:
+            times = frames / frame_rate(fps)
+        self.offsets = np.abs(times - times[0]) / abs(rate)
+        self.t0 = None
+
+    def start(self, now=None):
+        self.t0 = time.perf_counter() if now is None else now
+
+    def position(self, now=None):
+        #Position in frames of the frame that should be on screen now
+        if self.t0 is None:
+            return 0
+        if now is None:
+            now = time.perf_counter()
+        return max(0, int(np.searchsorted(self.offsets, now - self.t0, side='right')) - 1)
+
+
+class Player:
+    """
+    Plays part of a video against a PlaybackClock.
+
+    A worker thread with its own reader decodes the frames ahead into a
+    ring buffer holding up to ring frames. next_frame() is called by the
+    display as often as it likes and returns the newest frame that is due.
+    Frames whose time has passed before they were shown are dropped rather
+    than shown late, and the worker skips ahead to the clock when it falls
+    behind, so playback keeps time when decoding or display can't keep up.
+    dropped counts the frames not shown. Frames are uncropped so a change
+    of crop applies straight away.
+    """
+
+    def __init__(self, readvid, frames, rate=1.0, ring=8, cache_mb=256):
+        self.readvid = readvid
+        self.frames = frames
+        self.clock = PlaybackClock(frames, readvid.fps, index=readvid.index, rate=rate)
+        self.ring = ring
+        #Reverse play decodes forward from each keyframe, so the cache
+        #needs to hold about a keyframe interval of frames.
+        self.cache_mb = cache_mb
+        self.dropped = 0
+        self.shown = 0
+        self._last = -1
+        self._buffer = deque()
+        self._ended = False
+        self._halt = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        reader = ReadCropVideo(filename=self.readvid.filename, cache_mb=self.cache_mb, build_index=False)
+        if self.readvid.index is not None:
+            reader.set_index(self.readvid.index)
+        try:
+            i = 0
+            while i < len(self.frames) and not self._halt:
+                #Don't decode frames that are already late
+                i = max(i, self.clock.position())
+                frame = reader.read_uncropped(n=int(self.frames[i]))
+                with self._cond:
+                    while len(self._buffer) >= self.ring and not self._halt:
+                        self._cond.wait()
+                    self._buffer.append((i, frame))
+                i += 1
+        except Exception as e:
+            print('Playback stopped: {}'.format(e))
+        finally:
+            reader.close()
+            self._ended = True
+
+    def next_frame(self, now=None):
+        #(frame number, uncropped frame) due now, or None to keep the current one
+        if now is None:
+            now = time.perf_counter()
+        item = None
+        with self._cond:
+            if self.clock.t0 is None:
+                #The clock starts when the first frame is ready
+                if not self._buffer:
+                    return None
+                self.clock.start(now)
+            due = self.clock.position(now)
+            while self._buffer and self._buffer[0][0] <= due:
+                item = self._buffer.popleft()
+            self._cond.notify_all()
+        if item is None:
+            return None
+        i, frame = item
+        self.dropped += i - self._last - 1
+        self.shown += 1
+        self._last = i
+        return int(self.frames[i]), frame
+
+    @property
+    def finished(self):
+        return self._last == len(self.frames) - 1 or (self._ended and not self._buffer)
+
+    def stop(self):
+        with self._cond:
+            self._halt = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
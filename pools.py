@@ -0,0 +1,46 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+
+
+def spawn_pool(workers):
+    #spawn rather than fork as the viewer process has Qt and threads running
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+class PoolBuilder(threading.Thread):
+    """
+    Fills a store in the background using a pool of worker processes.
+    Subclasses yield the work from batches() as lists of (function, args)
+    run together; the next batch is only submitted once one has finished,
+    so stop() takes effect between batches. The first failure is printed
+    and ends the build.
+    """
+    label = 'Build'
+
+    def __init__(self, workers=2):
+        super().__init__(daemon=True)
+        self.workers = workers
+        self._halt = threading.Event()
+
+    def batches(self):
+        raise NotImplementedError
+
+    def run(self):
+        with spawn_pool(self.workers) as pool:
+            for batch in self.batches():
+                if self._halt.is_set():
+                    return
+                try:
+                    futures = [pool.submit(fn, *args) for fn, args in batch]
+                except RuntimeError:
+                    #The interpreter is shutting down
+                    return
+                wait(futures)
+                for future in futures:
+                    if future.exception() is not None:
+                        print('{} failed: {}'.format(self.label, future.exception()))
+                        return
+
+    def stop(self):
+        self._halt.set()
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from readcropvid import ReadCropVideo
+
+
+class FramePrefetcher:
+    """
+    Decodes frames ahead of the viewer on background threads.
+
+    Each call to update() tells the prefetcher which frame is being
+    shown. The difference from the previous call gives the direction
+    and stride of travel (a fast wheel spin or a slider step jumps
+    several frames at once) and the next depth frames along that path
+    are queued for decoding. Decoded frames go into the reader's
+    FrameCache, which bounds how much is held in memory, so load_frame
+    normally finds the frame already there.
+
+    Every worker opens its own handle on the file because decoders
+    cannot be shared between threads.
+    """
+
+    def __init__(self, readvid, depth=8, workers=1):
+        self.readvid = readvid
+        self.depth = depth
+        self.direction = 1
+        self.stride = 1
+        self._last = None
+        self._pending = []
+        self._inflight = set()
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def update(self, n):
+        #Called whenever the displayed frame changes.
+        if self._last is not None and n != self._last:
+            delta = n - self._last
+            self.direction = 1 if delta > 0 else -1
+            self.stride = abs(delta)
+        self._last = n
+
+        targets = []
+        for k in range(1, self.depth + 1):
+            m = n + self.direction * self.stride * k
+            if m < 0 or m >= self.readvid.num_frames:
+                break
+            targets.append(m)
+        with self._cond:
+            #Anything queued for the old position is no longer useful.
+            self._pending = [m for m in targets if m not in self._inflight
+                             and not self.readvid.is_decoded(m)]
+            self._cond.notify_all()
+
+    def wait(self, n, timeout=1.0):
+        #Block until frame n is no longer being decoded by a worker.
+        #Returns True if the frame is then in the cache.
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while n in self._inflight:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return self.readvid.is_decoded(n)
+
+    def _run(self):
+        reader = None
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    break
+                n = self._pending.pop(0)
+                self._inflight.add(n)
+            try:
+                if reader is None:
+                    reader = ReadCropVideo(filename=self.readvid.filename, cache_mb=0, build_index=False)
+                reader.index = self.readvid.index
+                self.readvid.cache.put(n, reader.read_uncropped(n=n))
+            except Exception as e:
+                print('Prefetch of frame {} failed: {}'.format(n, e))
+            finally:
+                with self._cond:
+                    self._inflight.discard(n)
+                    self._cond.notify_all()
+        if reader is not None:
+            reader.close()
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._pending = []
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
@@ -0,0 +1,88 @@
+import threading
+
+import cv2
+import numpy as np
+
+from filecache import cache_path, open_npy
+from framesources import as_uint8
+
+
+class ProxyStore:
+    """
+    Reduced resolution copy of every frame of a video for fast scrubbing.
+
+    Frames are stored uncompressed, shrunk by factor in each direction, in
+    a memory mapped .npy file in the cache dir. A second small file records
+    which frames have been written so a part built proxy is usable straight
+    away and building can carry on where it stopped. At factor 4 a 4K
+    frame takes 1.5 MB on disk.
+    """
+
+    def __init__(self, filename, num_frames, height, width, channels=3, factor=4):
+        self.factor = factor
+        self.width = width
+        self.height = height
+        shape = (num_frames, -(-height // factor), -(-width // factor), channels)
+        path = cache_path(filename, '.proxy{}.npy'.format(factor))
+        self.frames = open_npy(path, shape, np.uint8)
+        self.done = open_npy(path[:-4] + '.done.npy', (num_frames,), np.uint8)
+
+    @property
+    def num_frames(self):
+        return len(self.done)
+
+    def has(self, n):
+        return 0 <= n < self.num_frames and self.done[n]
+
+    def write(self, n, frame):
+        small = cv2.resize(as_uint8(frame), (self.frames.shape[2], self.frames.shape[1]), interpolation=cv2.INTER_AREA)
+        self.frames[n] = small.reshape(self.frames.shape[1:])
+        self.done[n] = 1
+
+    def read(self, n, crop_vals):
+        '''
+        Proxy of frame n covering crop_vals, which are full resolution
+        coordinates. The proxy pixels start at or before the crop corner so
+        also returns the full resolution offset of the image from the crop
+        corner, for lining it up with full resolution frames.
+        '''
+        f = self.factor
+        (x0, x1), (y0, y1) = crop_vals
+        x1, y1 = min(x1, self.width), min(y1, self.height)
+        px0, py0 = x0 // f, y0 // f
+        px1, py1 = -(-x1 // f), -(-y1 // f)
+        image = np.asarray(self.frames[n, py0:py1, px0:px1])
+        return image, (px0 * f - x0, py0 * f - y0)
+
+    def flush(self):
+        self.frames.flush()
+        self.done.flush()
+
+
+class ProxyBuilder(threading.Thread):
+    """
+    Fills a ProxyStore on a background thread with its own reader,
+    skipping frames already written by an earlier run.
+    """
+
+    def __init__(self, reader, store):
+        super().__init__(daemon=True)
+        self.reader = reader
+        self.store = store
+        self._halt = threading.Event()
+
+    def run(self):
+        try:
+            for n in range(self.store.num_frames):
+                if self._halt.is_set():
+                    break
+                if not self.store.done[n]:
+                    self.store.write(n, self.reader.read_uncropped(n=n, cache=False))
+        except Exception as e:
+            print('Proxy stopped at frame {}: {}'.format(n, e))
+        finally:
+            self.store.flush()
+            self.reader.close()
+
+    def stop(self):
+        self._halt.set()
@@ -1,12 +1,17 @@
-from PyQt5.QtCore import Qt, pyqtSignal, QRectF
-from PyQt5.QtGui import QPixmap, QImage, QPainterPath, QCloseEvent, QWheelEvent
+from PyQt5.QtCore import Qt, pyqtSignal, QRectF, QRect, QTimer, QPoint
+from PyQt5.QtGui import QPixmap, QImage, QPainterPath, QCloseEvent, QWheelEvent, QPainter, QFont, QColor
 from PyQt5.QtWidgets import (QWidget, QSlider, QCheckBox, QHBoxLayout,
                              QLabel, QComboBox, QSizePolicy, QVBoxLayout,
                              QApplication, QGraphicsView, QGraphicsScene,
-                             QLineEdit, QSpinBox, QInputDialog
+                             QLineEdit, QSpinBox, QInputDialog, QProgressBar,
+                             QPushButton, QGraphicsItem, QStyleOptionGraphicsItem,
+                             QStyle
                              )
+import math
+import os
 import numpy as np
-import qimage2ndarray as qim
+import time
+import perf
 
 
 class Spinbox_Slider(QWidget):
@@ -14,9 +19,14 @@ class Spinbox_Slider(QWidget):
     Groupbox containing slider and spinbox in horizontal layout.
     """
 
-    def __init__(self, parent, title, update_viewer_fn, initial_val = 0, min=0, max=1, step=1, *args, **kwargs):
+    def __init__(self, parent, title, update_viewer_fn, initial_val = 0, min=0, max=1, step=1, live_update_fn=None,
+                 activity_bar=False, *args, **kwargs):
         self.update_viewer = update_viewer_fn
+        #Optionally called with each new value while the slider is dragged.
+        self.live_update = live_update_fn
         super(Spinbox_Slider,self).__init__(*args,**kwargs)
+        #Optional ActivityBar under the slider covering the same range.
+        self.activity = ActivityBar() if activity_bar else None
 
         layout_inner = QHBoxLayout()
         label = QLabel(title)
@@ -36,12 +46,20 @@ class Spinbox_Slider(QWidget):
         self.set_slider_range(self.vid_start, self.vid_end, step)  # slider.setRange
 
 
-        layout_inner.addWidget(self.slider)
+        if self.activity is None:
+            layout_inner.addWidget(self.slider)
+        else:
+            slider_box = QVBoxLayout()
+            slider_box.setSpacing(0)
+            slider_box.addWidget(self.slider)
+            slider_box.addWidget(self.activity)
+            layout_inner.addLayout(slider_box)
         layout_inner.addWidget(self.spinbox)
 
         self.slider.sliderReleased.connect(
             lambda slider_val=self.slider.value: self.value_changed(slider_val)
             )
+        self.slider.sliderMoved.connect(self.slider_moved)
         self.spinbox.editingFinished.connect(
             lambda spinbox_val=self.spinbox.value: self.value_changed(spinbox_val)
             )
@@ -52,6 +70,12 @@ class Spinbox_Slider(QWidget):
         self.set_slider_value(new_value)
         self.update_viewer(new_value)
 
+    def slider_moved(self, value):
+        self.spinbox.setValue(value)
+        self.value = value
+        if self.live_update is not None:
+            self.live_update(value)
+
     def set_slider_value(self, value):
         self.slider.setValue(value)
         self.spinbox.setValue(value)
@@ -75,6 +99,8 @@ class Spinbox_Slider(QWidget):
         self.step=step
         self.slider.setRange(start, end)
         self.spinbox.setRange(start,end)
+        if self.activity is not None:
+            self.activity.set_range(start, end)
 
     def mousePressEvent(self, event):
         if event.button() == Qt.RightButton:
@@ -87,6 +113,314 @@ class Spinbox_Slider(QWidget):
             super().mousePressEvent(event)
 
 
+class ActivityBar(QWidget):
+    """
+    Heatmap of an ActivityStore over frames start to end, drawn under a
+    slider. Each pixel shows the most active frame it covers, scaled so
+    the threshold is full red. Polls the store while it is being filled.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ActivityBar, self).__init__(*args, **kwargs)
+        self.store = None
+        self.threshold = None
+        self.start = 0
+        self.end = 1
+        self._done = -1
+        self.setFixedHeight(6)
+        self.timer = QTimer()
+        self.timer.timeout.connect(self._poll)
+
+    def set_store(self, store, threshold=None):
+        #threshold None uses the store's own, store None clears the bar
+        self.store = store
+        self.threshold = threshold
+        self._done = -1
+        if store is None:
+            self.timer.stop()
+        else:
+            self.timer.start(500)
+        self.update()
+
+    def current_threshold(self):
+        if self.threshold is not None:
+            return self.threshold
+        return self.store.threshold()
+
+    def set_range(self, start, end):
+        self.start = start
+        self.end = end
+        self.update()
+
+    def _poll(self):
+        done = int(self.store.done.sum())
+        if done != self._done:
+            self._done = done
+            self.update()
+        if self.store.complete():
+            self.timer.stop()
+
+    def paintEvent(self, event):
+        if self.store is None:
+            return
+        #Line up with the slider groove, which is inset by half the handle
+        inset = self.style().pixelMetric(QStyle.PM_SliderLength) // 2
+        width = max(1, self.width() - 2 * inset)
+        end = min(self.end, self.store.num_frames - 1)
+        if end < self.start:
+            return
+        values = np.where(self.store.done[self.start:end + 1], self.store.values[self.start:end + 1], 0)
+        edges = np.linspace(0, len(values), width + 1).astype(int)[:-1]
+        heat = np.maximum.reduceat(values, edges) / max(self.current_threshold(), 1e-6)
+        row = np.zeros((1, width, 3), dtype=np.uint8)
+        row[0, :, 0] = np.clip(255 * heat, 0, 255)
+        row[0, :, 1] = np.clip(255 * (heat - 1), 0, 255)
+        image = QImage(row.data, width, 1, row.strides[0], QImage.Format_RGB888)
+        painter = QPainter(self)
+        painter.drawImage(QRect(inset, 0, width, self.height()), image)
+        painter.end()
+
+
+class Filmstrip(QWidget):
+    """
+    Strip of evenly spaced thumbnails covering the whole video, drawn from a
+    ThumbnailStore that is filled in the background. The strip is redrawn
+    as thumbnails arrive, using the nearest finished one for each slot.
+    Hovering shows an enlarged thumbnail and frame number without reading
+    the frame from the video. Clicking emits frameSelected.
+    """
+    frameSelected = pyqtSignal(int)
+
+    def __init__(self, *args, **kwargs):
+        super(Filmstrip, self).__init__(*args, **kwargs)
+        self.store = None
+        self._strip = None
+        self._done = -1
+        self.setMouseTracking(True)
+        self.setMinimumHeight(32)
+        self.setMaximumHeight(64)
+        self.preview = QLabel(self, Qt.ToolTip)
+        self.preview.setAlignment(Qt.AlignCenter)
+        self.timer = QTimer()
+        self.timer.timeout.connect(self._poll)
+
+    def set_store(self, store):
+        self.store = store
+        self._strip = None
+        self._done = -1
+        self.timer.start(250)
+        self.update()
+
+    def _poll(self):
+        #Redraw when more thumbnails have been finished by the workers
+        done = int(self.store.done.sum())
+        if done != self._done:
+            self._done = done
+            self._strip = None
+            self.update()
+        if self.store.complete():
+            self.timer.stop()
+
+    def frame_at(self, x):
+        x = min(max(x, 0), self.width() - 1)
+        return int(x * self.store.num_frames / max(self.width(), 1))
+
+    def _build_strip(self):
+        thumb_h, thumb_w = self.store.shape[1:3]
+        slots = max(1, self.width() * thumb_h // (self.height() * thumb_w))
+        strip = np.zeros((thumb_h, slots * thumb_w, 3), dtype=np.uint8)
+        for s in range(slots):
+            i = self.store.nearest(s * self.store.count // slots)
+            if i is not None:
+                strip[:, s * thumb_w:(s + 1) * thumb_w] = self.store.thumbs[i]
+        self._strip = strip
+        self._stripImage = QImage(strip.data, strip.shape[1], strip.shape[0], strip.strides[0], QImage.Format_RGB888)
+
+    def paintEvent(self, event):
+        if self.store is None:
+            return
+        if self._strip is None:
+            self._build_strip()
+        painter = QPainter(self)
+        painter.drawImage(self.rect(), self._stripImage)
+        painter.end()
+
+    def resizeEvent(self, event):
+        self._strip = None
+        super().resizeEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.store is None:
+            return
+        frame = self.frame_at(event.pos().x())
+        i = self.store.nearest(self.store.index_of(frame))
+        if i is None:
+            return
+        thumb = np.ascontiguousarray(self.store.thumbs[i])
+        image = QImage(thumb.data, thumb.shape[1], thumb.shape[0], thumb.strides[0], QImage.Format_RGB888)
+        pixmap = QPixmap.fromImage(image).scaledToHeight(3 * thumb.shape[0], Qt.SmoothTransformation)
+        painter = QPainter(pixmap)
+        painter.setPen(Qt.yellow)
+        painter.drawText(4, 14, str(self.store.frame_of(i)))
+        painter.end()
+        self.preview.setPixmap(pixmap)
+        self.preview.resize(pixmap.size())
+        pos = self.mapToGlobal(QPoint(event.pos().x() - pixmap.width() // 2, -pixmap.height() - 4))
+        self.preview.move(pos)
+        self.preview.show()
+
+    def leaveEvent(self, event):
+        self.preview.hide()
+
+    def mousePressEvent(self, event):
+        if self.store is not None and event.button() == Qt.LeftButton:
+            self.frameSelected.emit(self.frame_at(event.pos().x()))
+
+
+class ExportProgress(QWidget):
+    """
+    Progress bar, status and cancel button for background exports.
+    The progress and finished signals take an ExportJob and may be
+    emitted from the export thread.
+    """
+    progress = pyqtSignal(object)
+    finished = pyqtSignal(object)
+
+    def __init__(self, cancel_fn, *args, **kwargs):
+        super(ExportProgress, self).__init__(*args, **kwargs)
+        self.jobs = 0
+
+        layout_inner = QHBoxLayout()
+        self.label = QLabel('')
+        self.bar = QProgressBar()
+        self.cancel_button = QPushButton('Cancel')
+        layout_inner.addWidget(self.label)
+        layout_inner.addWidget(self.bar)
+        layout_inner.addWidget(self.cancel_button)
+        self.setLayout(layout_inner)
+
+        self.cancel_button.clicked.connect(lambda x: cancel_fn())
+        self.progress.connect(self._show_progress)
+        self.finished.connect(self._job_finished)
+        self.hide()
+
+    def add_job(self):
+        self.jobs += 1
+        self.show()
+
+    def _show_progress(self, job):
+        self.bar.setMaximum(max(job.total, 1))
+        self.bar.setValue(job.done)
+        text = '{} {}/{} frames {:.1f} fps'.format(os.path.basename(job.output), job.done, job.total, job.fps)
+        if self.jobs > 1:
+            text += ' ({} queued)'.format(self.jobs - 1)
+        self.label.setText(text)
+
+    def _job_finished(self, job):
+        print('Export {}: {}'.format(job.status, job.output))
+        self.jobs -= 1
+        if self.jobs <= 0:
+            self.jobs = 0
+            self.hide()
+
+
+class TimeSeriesPlot(QWidget):
+    """
+    Plot of a RoiJob's values against frame number, one line per roi and
+    channel for the statistic chosen, redrawn as the job fills them in.
+    The progress signal takes the job and may be emitted from the job's
+    thread. Clicking the plot emits frameSelected, the current frame is
+    marked by set_frame.
+    """
+    progress = pyqtSignal(object)
+    frameSelected = pyqtSignal(int)
+
+    COLOURS = (Qt.blue, Qt.darkGreen, Qt.red, Qt.darkCyan, Qt.darkMagenta, Qt.darkYellow, Qt.black, Qt.gray)
+
+    def __init__(self, save_fn, cancel_fn, *args, **kwargs):
+        super(TimeSeriesPlot, self).__init__(*args, **kwargs)
+        self.job = None
+        self.frame = None
+
+        layout_inner = QVBoxLayout()
+        controls = QHBoxLayout()
+        self.stat_box = QComboBox()
+        self.label = QLabel('')
+        save_button = QPushButton('Save')
+        cancel_button = QPushButton('Cancel')
+        controls.addWidget(self.stat_box)
+        controls.addWidget(self.label)
+        controls.addWidget(save_button)
+        controls.addWidget(cancel_button)
+        layout_inner.addLayout(controls)
+        layout_inner.addStretch(1)
+        self.setLayout(layout_inner)
+        self.setMinimumWidth(320)
+
+        self.stat_box.currentIndexChanged.connect(lambda x: self.update())
+        save_button.clicked.connect(lambda x: save_fn())
+        cancel_button.clicked.connect(lambda x: cancel_fn())
+        self.progress.connect(self.set_job)
+
+    def set_job(self, job):
+        if self.stat_box.count() == 0:
+            self.stat_box.addItems(job.stats)
+        self.job = job
+        self.label.setText('{} {}/{} frames'.format(job.status, job.done, job.total))
+        self.show()
+        self.update()
+
+    def set_frame(self, n):
+        self.frame = n
+        self.update()
+
+    def _plotRect(self):
+        top = self.stat_box.geometry().bottom() + 8
+        return QRect(8, top, self.width() - 16, self.height() - top - 8)
+
+    def paintEvent(self, event):
+        if self.job is None or self.job.total == 0:
+            return
+        rect = self._plotRect()
+        frames = self.job.frames
+        values = self.job.values[:, :, self.stat_box.currentIndex()]
+        values = values.reshape(len(frames), -1)
+        painter = QPainter(self)
+        painter.fillRect(rect, Qt.white)
+        painter.setPen(Qt.gray)
+        painter.drawRect(rect)
+        finite = np.isfinite(values)
+        if finite.any():
+            lo, hi = values[finite].min(), values[finite].max()
+            if hi == lo:
+                hi = lo + 1
+            x0, x1 = frames[0], max(frames[-1], frames[0] + 1)
+            xs = rect.left() + (frames - x0) * rect.width() / (x1 - x0)
+            #No more than a couple of points per pixel
+            every = max(1, len(frames) // (2 * max(rect.width(), 1)))
+            for line in range(values.shape[1]):
+                ys = rect.bottom() - (values[:, line] - lo) * rect.height() / (hi - lo)
+                painter.setPen(self.COLOURS[line % len(self.COLOURS)])
+                points = [QPoint(int(x), int(y)) for x, y in zip(xs[::every], ys[::every]) if np.isfinite(y)]
+                for a, b in zip(points[:-1], points[1:]):
+                    painter.drawLine(a, b)
+            painter.setPen(Qt.black)
+            painter.drawText(rect.left() + 4, rect.top() + 14, '{:.4g}'.format(hi))
+            painter.drawText(rect.left() + 4, rect.bottom() - 4, '{:.4g}'.format(lo))
+            if self.frame is not None and x0 <= self.frame <= x1:
+                x = int(rect.left() + (self.frame - x0) * rect.width() / (x1 - x0))
+                painter.setPen(Qt.red)
+                painter.drawLine(x, rect.top(), x, rect.bottom())
+        painter.end()
+
+    def mousePressEvent(self, event):
+        rect = self._plotRect()
+        if self.job is not None and self.job.total and rect.contains(event.pos()):
+            frames = self.job.frames
+            i = (event.pos().x() - rect.left()) * (len(frames) - 1) // max(rect.width(), 1)
+            self.frameSelected.emit(int(frames[min(max(i, 0), len(frames) - 1)]))
+
+
 class QWidgetMod(QWidget):
     """
     Overrides the closeEvent method of QWidget to print out the parameters set
@@ -105,6 +439,82 @@ class QWidgetMod(QWidget):
         print('------------------------------')
 
 
+class TiledImageItem(QGraphicsItem):
+    """
+    Scene item drawing a large ndarray image in tiles at a level of detail
+    matching the zoom. Level k is the image reduced 2**k times, each tile
+    covering tileSize * 2**k image pixels. Tiles are only made, converted
+    and uploaded when a paint needs them, so only the part of the frame in
+    view is touched, and are kept until the next setArray so panning and
+    zooming reuse them.
+    """
+
+    def __init__(self, tileSize=512):
+        QGraphicsItem.__init__(self)
+        self.tileSize = tileSize
+        self.array = None
+        self._tiles = {}
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def setArray(self, array):
+        #Tiles are made from the array when painted, after this returns,
+        #so an array its owner may write again (such as a StreamSet
+        #display buffer) is copied. Read-only ones, e.g. cached frames, are not.
+        if array.flags.writeable:
+            array = array.copy()
+        if self.array is None or array.shape[:2] != self.array.shape[:2]:
+            self.prepareGeometryChange()
+        self.array = array
+        self._tiles = {}
+        self.update()
+
+    def boundingRect(self):
+        if self.array is None:
+            return QRectF()
+        return QRectF(0, 0, self.array.shape[1], self.array.shape[0])
+
+    def _tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self._tiles.get(key)
+        if pixmap is None:
+            span = self.tileSize << level
+            region = self.array[ty * span:(ty + 1) * span, tx * span:(tx + 1) * span]
+            # Every 2**level'th pixel, the same sampling as Qt's fast
+            # transformation of a whole frame, reading only what is kept.
+            region = np.ascontiguousarray(region[::1 << level, ::1 << level])
+            if region.dtype == np.uint8 and region.ndim == 2:
+                qimage = QImage(region.data, region.shape[1], region.shape[0], region.strides[0],
+                                QImage.Format_Grayscale8)
+            elif region.dtype == np.uint8 and region.ndim == 3 and region.shape[2] == 3:
+                qimage = QImage(region.data, region.shape[1], region.shape[0], region.strides[0],
+                                QImage.Format_RGB888)
+            else:
+                import qimage2ndarray as qim
+                qimage = qim.array2qimage(region)
+            pixmap = QPixmap.fromImage(qimage)
+            self._tiles[key] = pixmap
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        if self.array is None:
+            return
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        h, w = self.array.shape[:2]
+        level = 0
+        if lod < 1:
+            level = min(int(math.log2(1 / lod)), int(math.log2(max(w, h))))
+        span = self.tileSize << level
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        with perf.stage('convert'):
+            for ty in range(int(exposed.top()) // span, int(math.ceil(exposed.bottom())) // span + 1):
+                for tx in range(int(exposed.left()) // span, int(math.ceil(exposed.right())) // span + 1):
+                    if tx * span >= w or ty * span >= h:
+                        continue
+                    target = QRectF(tx * span, ty * span, min(span, w - tx * span), min(span, h - ty * span))
+                    pixmap = self._tile(level, tx, ty)
+                    painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+
 class QtImageViewer(QGraphicsView):
     """ PyQt image viewer widget for a QPixmap in a QGraphicsView scene with mouse zooming and panning.
     Displays a QImage or QPixmap (QImage is internally converted to a QPixmap).
@@ -128,6 +538,10 @@ class QtImageViewer(QGraphicsView):
     leftMouseButtonDoubleClicked = pyqtSignal(float, float)
     rightMouseButtonDoubleClicked = pyqtSignal(float, float)
     scrollMouseButton = pyqtSignal(float)
+    # Emitted after each paint of the view while it has an image.
+    imagePainted = pyqtSignal()
+    # Emitted on a left click over the image with its scene (x, y) and the pixel value there.
+    pixelClicked = pyqtSignal(float, float, object)
 
     def __init__(self):
         QGraphicsView.__init__(self)
@@ -139,6 +553,18 @@ class QtImageViewer(QGraphicsView):
         # Store a local handle to the scene's current image pixmap.
         self._pixmapHandle = None
 
+        # Reused between frames: contiguous copy of the last frame, the
+        # pixmap it is converted into and the scene layout it was shown with.
+        self._displayBuffer = None
+        self._displayArray = None
+        self._pixmap = QPixmap()
+        self._layout = None
+
+        # ndarrays of more than tiledPixels pixels are drawn by a TiledImageItem
+        # rather than converted whole, see setImage.
+        self.tiledPixels = 4000000
+        self._tiledItem = None
+
         # Image aspect ratio mode.
         # !!! ONLY applies to full image. Aspect ratio is always ignored when zooming.
         #   Qt.IgnoreAspectRatio: Scale image to fit viewport.
@@ -160,6 +586,13 @@ class QtImageViewer(QGraphicsView):
         self.canZoom = True
         self.canPan = True
 
+        # Performance overlay, toggled with F12. F11 saves a trace file.
+        self.showPerf = False
+        self._perfTimer = QTimer()
+        self._perfTimer.timeout.connect(lambda: self.viewport().update())
+        # Scene position of the last left click, whose pixel value is shown in the overlay.
+        self._pixelPos = None
+
     def hasImage(self):
         """ Returns whether or not the scene contains an image pixmap.
         """
@@ -171,11 +604,15 @@ class QtImageViewer(QGraphicsView):
         if self.hasImage():
             self.scene.removeItem(self._pixmapHandle)
             self._pixmapHandle = None
+            self._layout = None
 
     def pixmap(self):
         """ Returns the scene's current image pixmap as a QPixmap, or else None if no image exists.
         :rtype: QPixmap | None
         """
+        if self._pixmapHandle is self._tiledItem and self.hasImage():
+            import qimage2ndarray as qim
+            return QPixmap.fromImage(qim.array2qimage(self._tiledItem.array))
         if self.hasImage():
             return self._pixmapHandle.pixmap()
         return None
@@ -185,7 +622,7 @@ class QtImageViewer(QGraphicsView):
         :rtype: QImage | None
         """
         if self.hasImage():
-            return self._pixmapHandle.pixmap().toImage()
+            return self.pixmap().toImage()
         return None
 
     def QPixmapToArray(self, pixmap):
@@ -201,28 +638,88 @@ class QtImageViewer(QGraphicsView):
         img = np.frombuffer(byte_str, dtype=np.uint8).reshape((w, h, 4))
         return img
 
-    def setImage(self, image):
+    def arrayToQImage(self, image):
+        """ Wrap a uint8 RGB or grayscale ndarray in a QImage without converting its pixels.
+        Non contiguous arrays (e.g. crops) are first copied into a buffer kept for
+        the next frame of the same shape. Returns None for other arrays.
+        The QImage does not own its memory so is only valid until the next call.
+        :rtype: QImage | None
+        """
+        if image.dtype != np.uint8:
+            return None
+        if image.ndim == 2:
+            fmt = QImage.Format_Grayscale8
+        elif image.ndim == 3 and image.shape[2] == 3:
+            fmt = QImage.Format_RGB888
+        else:
+            return None
+        if not image.flags['C_CONTIGUOUS']:
+            if self._displayBuffer is None or self._displayBuffer.shape != image.shape:
+                self._displayBuffer = np.empty(image.shape, dtype=np.uint8)
+            np.copyto(self._displayBuffer, image)
+            image = self._displayBuffer
+        self._displayArray = image
+        return QImage(image.data, image.shape[1], image.shape[0], image.strides[0], fmt)
+
+    def setImage(self, image, scale=1, offset=(0, 0), size=None):
         """ Set the scene's current image pixmap to the input QImage or QPixmap.
         Raises a RuntimeError if the input image has type other than QImage or QPixmap.
+        scale and offset place a reduced resolution image (e.g. a proxy) over
+        the area of the full resolution one, size is that area's (width, height).
+        Scene coordinates are always full resolution pixels.
+        ndarrays larger than tiledPixels are not converted here but drawn
+        tile by tile as they are painted, see TiledImageItem.
         :type image: QImage | QPixmap
         """
         self.image = image
-        print(np.shape(image))
-        if type(image) is QPixmap:
-            pixmap = image
-        elif type(image) is QImage:
-            pixmap = QPixmap.fromImage(image)
-        elif type(image) is np.ndarray:
-            pixmap = QPixmap.fromImage(qim.array2qimage(image))
-        else:
-            raise RuntimeError("ImageViewer.setImage: Argument must be a QImage or QPixmap.")
-        self.geometry = pixmap.rect()
+        perf.frame_shown()
+        if type(image) is np.ndarray and image.shape[0] * image.shape[1] > self.tiledPixels:
+            if self._tiledItem is None:
+                self._tiledItem = TiledImageItem()
+            if self._pixmapHandle is not self._tiledItem:
+                self.clearImage()
+                self.scene.addItem(self._tiledItem)
+                self._pixmapHandle = self._tiledItem
+            self._tiledItem.setArray(image)
+            self.image = self._tiledItem.array
+            self._setLayout((image.shape[1] * scale, image.shape[0] * scale), scale, offset)
+            return
+        with perf.stage('convert'):
+            if type(image) is QPixmap:
+                pixmap = image
+            elif type(image) is QImage:
+                pixmap = QPixmap.fromImage(image)
+            elif type(image) is np.ndarray:
+                qimage = self.arrayToQImage(image)
+                if qimage is None:
+                    #Only other types and layouts need qimage2ndarray, so it is imported here
+                    import qimage2ndarray as qim
+                    qimage = qim.array2qimage(image)
+                self._pixmap.convertFromImage(qimage)
+                pixmap = self._pixmap
+            else:
+                raise RuntimeError("ImageViewer.setImage: Argument must be a QImage or QPixmap.")
+        if size is None:
+            size = (pixmap.width() * scale, pixmap.height() * scale)
+        if self.hasImage() and self._pixmapHandle is self._tiledItem:
+            self.clearImage()
         if self.hasImage():
             self._pixmapHandle.setPixmap(pixmap)
         else:
             self._pixmapHandle = self.scene.addPixmap(pixmap)
-        self.setSceneRect(QRectF(pixmap.rect()))  # Set scene size to image size.
-        self.updateViewer()
+        self._setLayout(size, scale, offset)
+
+    def _setLayout(self, size, scale, offset):
+        # Stepping through frames of one size leaves the scene as it is.
+        layout = (int(size[0]), int(size[1]), scale, tuple(offset))
+        if layout != self._layout:
+            self._layout = layout
+            self.geometry = QRect(0, 0, layout[0], layout[1])
+            self._pixmapHandle.setScale(scale)
+            self._pixmapHandle.setPos(offset[0], offset[1])
+            self.setSceneRect(QRectF(self.geometry))  # Set scene size to image size.
+            with perf.stage('fit'):
+                self.updateViewer()
 
     def updateViewer(self):
         """ Show current zoom (if showing entire image, apply current aspect ratio mode).
@@ -241,6 +738,69 @@ class QtImageViewer(QGraphicsView):
         """
         self.updateViewer()
 
+    def paintEvent(self, event):
+        with perf.stage('paint'):
+            QGraphicsView.paintEvent(self, event)
+        if self.hasImage():
+            perf.frame_painted()
+            self.imagePainted.emit()
+
+    def pixelValue(self, scenePos):
+        """ Value of the current ndarray image at scenePos, allowing for a scaled proxy image,
+        or None if there is none there.
+        """
+        if not self.hasImage() or type(self.image) is not np.ndarray:
+            return None
+        imagePos = self._pixmapHandle.mapFromScene(scenePos)
+        x, y = int(imagePos.x()), int(imagePos.y())
+        if 0 <= y < self.image.shape[0] and 0 <= x < self.image.shape[1]:
+            return self.image[y, x]
+        return None
+
+    def drawForeground(self, painter, rect):
+        """ Draw the performance overlay and the value of the last clicked pixel
+        over the top left of the view.
+        """
+        lines = perf.report().split('\n') if self.showPerf else []
+        if self._pixelPos is not None:
+            value = self.pixelValue(self._pixelPos)
+            if value is not None:
+                lines.append('({:.0f}, {:.0f}) {}'.format(self._pixelPos.x(), self._pixelPos.y(), value))
+        if not lines:
+            return
+        painter.save()
+        painter.resetTransform()
+        painter.setFont(QFont('Monospace', 9))
+        height = painter.fontMetrics().height()
+        width = max(painter.fontMetrics().width(line) for line in lines)
+        painter.fillRect(0, 0, width + 8, height * len(lines) + 8, QColor(0, 0, 0, 160))
+        painter.setPen(Qt.yellow)
+        for i, line in enumerate(lines):
+            painter.drawText(4, 4 + height * (i + 1) - painter.fontMetrics().descent(), line)
+        painter.restore()
+
+    def togglePerfOverlay(self):
+        """ Show or hide the overlay. Timing is only switched on while it is shown.
+        """
+        self.showPerf = not self.showPerf
+        perf.enabled = self.showPerf
+        if self.showPerf:
+            perf.reset()
+            self._perfTimer.start(500)
+        else:
+            self._perfTimer.stop()
+        self.viewport().update()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_F12:
+            self.togglePerfOverlay()
+        elif event.key() == Qt.Key_F11:
+            filename = time.strftime('viewer_trace_%Y%m%d_%H%M%S.json')
+            count = perf.dump_trace(filename)
+            print('Saved {} timed spans to {}'.format(count, os.path.abspath(filename)))
+        else:
+            QGraphicsView.keyPressEvent(self, event)
+
     def mousePressEvent(self, event):
         """ Start mouse pan or zoom mode.
         """
@@ -249,11 +809,11 @@ class QtImageViewer(QGraphicsView):
             if self.canPan:
                 self.setDragMode(QGraphicsView.ScrollHandDrag)
             self.leftMouseButtonPressed.emit(scenePos.x(), scenePos.y())
-            print('Pixel Coords:')
-            print('(' + str(scenePos.x()) + ',' + str(scenePos.y()) + ')')
-            print('Pixel Intensities:')
-            print(self.image[int(scenePos.y()), int(scenePos.x()),:])
-            print('\n')
+            self._pixelPos = scenePos
+            value = self.pixelValue(scenePos)
+            if value is not None:
+                self.pixelClicked.emit(scenePos.x(), scenePos.y(), value)
+            self.viewport().update()
         elif event.button() == Qt.RightButton:
             if self.canZoom:
                 self.setDragMode(QGraphicsView.RubberBandDrag)
@@ -0,0 +1,137 @@
+import json
+import os
+
+import numpy as np
+
+from filecache import cache_path, file_key
+
+
+HEADER_SIZE = 4096
+MAGIC = b'VIEWRAW1'
+
+
+class RawFrameStore:
+    """
+    Uncompressed frames unpacked from a video into one memory mapped file.
+
+    The file is a HEADER_SIZE byte header (magic then JSON giving shape,
+    dtype, the source video and frame range, and how many frames have been
+    written) followed by the frames as one C ordered array. Store frame i
+    is video frame start + i * step. Reading a frame is a slice of the
+    mapping, so the OS page cache does the work and any number of viewers
+    can read the same store at once.
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.header = _read_header(path)
+        self.shape = tuple(self.header['shape'])
+        self.dtype = np.dtype(self.header['dtype'])
+        self.start = self.header['start']
+        self.step = self.header['step']
+        self.done = self.header['done']
+        self.frames = np.memmap(path, dtype=self.dtype, mode=mode, offset=HEADER_SIZE, shape=self.shape)
+
+    @classmethod
+    def create(cls, path, shape, dtype, source, start, step):
+        #Opens a matching part written store for writing, else makes a new one
+        try:
+            store = cls(path, mode='r+')
+            if store.shape == tuple(shape) and store.dtype == np.dtype(dtype) \
+                    and store.matches(source, start, step, shape[0]):
+                return store
+        except (OSError, ValueError):
+            pass
+        header = {'shape': list(shape), 'dtype': np.dtype(dtype).str, 'source': file_key(source),
+                  'start': start, 'step': step, 'done': 0}
+        #Made under another name and renamed so viewers that have the old
+        #store mapped keep reading it rather than a truncated file.
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.truncate(HEADER_SIZE + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        _write_header(tmp, header)
+        os.replace(tmp, path)
+        return cls(path, mode='r+')
+
+    def matches(self, source, start, step, count):
+        return (self.header['source'] == file_key(source) and self.start == start
+                and self.step == step and self.shape[0] == count)
+
+    @property
+    def complete(self):
+        return self.done == self.shape[0]
+
+    def index_of(self, n):
+        #Store index holding video frame n, or None
+        i, r = divmod(n - self.start, self.step)
+        if r or i < 0 or i >= self.shape[0]:
+            return None
+        if i >= self.done and not self.complete:
+            #Another process may still be unpacking
+            self.done = _read_header(self.path)['done']
+        return i if i < self.done else None
+
+    def read(self, n):
+        #Video frame n as a read only view of the mapping, or None
+        i = self.index_of(n)
+        if i is None:
+            return None
+        return np.asarray(self.frames[i])
+
+    def set_done(self, done):
+        self.frames.flush()
+        self.done = done
+        self.header['done'] = done
+        _write_header(self.path, self.header)
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if not data.startswith(MAGIC):
+        raise ValueError(path + ' is not a raw frame store')
+    return json.loads(data[len(MAGIC):].rstrip(b'\0').decode())
+
+
+def _write_header(path, header):
+    data = MAGIC + json.dumps(header).encode()
+    with open(path, 'r+b') as f:
+        f.write(data.ljust(HEADER_SIZE, b'\0'))
+
+
+def raw_store_path(filename):
+    return cache_path(filename, '.raw')
+
+
+def find_raw_store(filename):
+    #The unpacked store for filename in the cache dir, opened read only, or None
+    path = raw_store_path(filename)
+    try:
+        store = RawFrameStore(path)
+    except (OSError, ValueError):
+        return None
+    if store.header['source'] != file_key(filename):
+        return None
+    return store
+
+
+class RawStoreWriter:
+    """
+    add_frame/close interface over a RawFrameStore for ExportJob. The
+    header's frame count is updated every chunk frames, which is the
+    most an interrupted unpack has to redo.
+    """
+
+    def __init__(self, store, done=0, chunk=64):
+        self.store = store
+        self.i = done
+        self.chunk = chunk
+
+    def add_frame(self, frame):
+        self.store.frames[self.i] = frame
+        self.i += 1
+        if self.i % self.chunk == 0:
+            self.store.set_done(self.i)
+
+    def close(self):
+        self.store.set_done(self.i)
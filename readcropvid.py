@@ -1,10 +1,56 @@
+import threading
+
+import cv2
+import numpy as np
 from labvision.video import ReadVideo
+import perf
+from framecache import FrameCache
+from frameindex import load_index, can_index, IndexBuilder
+from proxy import ProxyStore, ProxyBuilder
+from rawstore import RawFrameStore, find_raw_store
+from framesources import open_source, as_uint8
 
 
 class ReadCropVideo(ReadVideo):
+    '''
+    Videos are decoded through ReadVideo. Image sequences, TIFF stacks,
+    HDF5 datasets and .npy files are read through a FrameSource instead
+    (see framesources.open_source), everything else working the same.
+    '''
+
+    def __init__(self, filename=None, frame_range=(0,None,1), cache_mb=1024, max_skip=16, build_index=True, use_raw=True):
+        #Decoded uncropped frames are kept in an LRU cache limited to
+        #cache_mb megabytes so scrubbing back over frames is free.
+        self.cache = FrameCache(max_mb=cache_mb)
+        #Requests up to max_skip frames ahead of the decoder are reached
+        #by decoding forward rather than seeking, since a seek has to
+        #decode from the previous keyframe anyway.
+        self.max_skip = max_skip
+        #Held while decoding as the viewer reads from more than one thread.
+        self._lock = threading.RLock()
+        self.source = open_source(filename)
+        if self.source is None:
+            ReadVideo.__init__(self, filename=filename, frame_range=frame_range)
+        else:
+            self.filename = filename
+            self.num_frames = self.source.num_frames
+            self.width = self.source.width
+            self.height = self.source.height
+            self.fps = self.source.fps
+            self.frame_num = 0
+        self._next_frame = int(self.frame_num)
+        self._decoder_pos = int(self.frame_num)
+        #The underlying OpenCV capture, used to check where a seek landed.
+        capture = getattr(self, 'vid', None)
+        self._capture = capture if isinstance(capture, cv2.VideoCapture) else None
 
-    def __init__(self, filename=None, frame_range=(0,None,1)):
-        ReadVideo.__init__(self, filename=filename, frame_range=frame_range)
+        self.index = None
+        self.proxy = None
+        self._proxy_builder = None
+        #Frames unpacked to a raw store are read from it without decoding
+        self.raw = find_raw_store(self.filename) if use_raw and self.source is None else None
+        if build_index:
+            self.find_index()
 
         '''
         If loading a new video with different dimensions,
@@ -17,18 +63,221 @@ class ReadCropVideo(ReadVideo):
 
     def set_crop(self, crop_coords):
         #Crops image to size specified by crop_coords and sets mask to None.
+        #The cache holds uncropped frames so it stays valid.
         self.crop_vals = crop_coords
-        print(self.crop_vals)
+        #Row and column slices applied to each frame as it is read
+        self._roi = (slice(crop_coords[1][0], crop_coords[1][1]),
+                     slice(crop_coords[0][0], crop_coords[0][1]))
 
     def reset_crop(self):
         #To set crop back to max image size
         self.set_crop(((0, self.width),(0, self.height)))
 
+    def crop(self, frame):
+        #The current crop of a full frame, as a view
+        return frame[self._roi]
+
+    def crop_size(self):
+        #Width and height of the cropped frame
+        (x0, x1), (y0, y1) = self.crop_vals
+        return min(x1, self.width) - x0, min(y1, self.height) - y0
+
+    def start_proxy(self, factor=4):
+        #Build, or finish building, a 1/factor resolution proxy of every
+        #frame in the background. read_proxy returns frames as they appear.
+        frame = as_uint8(self.read_uncropped(n=0))
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        self.proxy = ProxyStore(self.filename, self.num_frames, self.height, self.width,
+                                channels=channels, factor=factor)
+        reader = ReadCropVideo(filename=self.filename, cache_mb=0, build_index=False)
+        reader.index = self.index
+        self._proxy_builder = ProxyBuilder(reader, self.proxy)
+        self._proxy_builder.start()
+
+    def read_proxy(self, n):
+        '''
+        Cropped proxy of frame n and its offset in full resolution pixels
+        from the crop corner, or None if that frame has no proxy yet.
+        The proxy is self.proxy.factor times smaller than read_frame(n).
+        '''
+        if self.proxy is None or not self.proxy.has(n):
+            return None
+        return self.proxy.read(n, self.crop_vals)
+
+    def is_decoded(self, n):
+        #True if frame n can be had without decoding it
+        if self.source is not None and self.source.mapped:
+            return True
+        return n in self.cache or (self.raw is not None and self.raw.index_of(n) is not None)
+
+    def attach_raw_store(self, path):
+        #Read frames from an unpacked RawFrameStore from now on
+        self.raw = RawFrameStore(path)
+
+    def read_uncropped(self, n=None, cache=True):
+        #Full decoded frame, served from the raw store or cache where possible.
+        if n is None:
+            n = self._next_frame
+        if self.raw is not None:
+            with perf.stage('raw'):
+                frame = self.raw.read(n)
+            if frame is not None:
+                self._next_frame = n + 1
+                return frame
+        if self.source is not None and self.source.mapped:
+            #Mapped frames are not cached, the page cache already holds them
+            with perf.stage('raw'):
+                frame = self.source.read(n)
+            self._next_frame = n + 1
+            return frame
+        frame = self.cache.get(n)
+        if frame is None and self.source is not None:
+            with self._lock, perf.stage('decode'):
+                frame = self.source.read(n)
+            if cache:
+                self.cache.put(n, frame)
+        elif frame is None:
+            with self._lock, perf.stage('decode'):
+                frame = self._decode(n, cache=cache)
+        self._next_frame = n + 1
+        return frame
+
+    def find_index(self, ready=None):
+        '''
+        Keyframe/timestamp index. A cached one is used straight away,
+        otherwise it is built in the background and seeks fall back to
+        frame numbers until it arrives. Returns True in that case, when
+        num_frames is the container's estimate until ready(self), if
+        given, is called from the builder's thread with it made exact.
+        ready is called even if the build fails, with the estimate kept.
+        '''
+        if self.source is not None:
+            return False
+        index = load_index(self.filename)
+        if index is not None:
+            self.set_index(index)
+            return False
+        if not can_index():
+            return False
+
+        def built(index):
+            if index is not None:
+                self.set_index(index)
+            if ready is not None:
+                ready(self)
+
+        IndexBuilder(self.filename, built).start()
+        return True
+
+    def set_index(self, index):
+        #The index counts frames exactly, unlike the container header
+        self.num_frames = index.num_frames
+        self.index = index
+
+    def _can_read_forward(self, n):
+        #Reading forward beats seeking when n is a short way ahead, or when
+        #no keyframe lies between the decoder and n so a seek would have
+        #to decode the same frames anyway.
+        if self._decoder_pos is None or n < self._decoder_pos:
+            return False
+        if n - self._decoder_pos <= self.max_skip:
+            return True
+        return self.index is not None and self.index.keyframe_before(n) <= self._decoder_pos
 
-    def read_frame(self, n=None):
-        frame = super().read_frame(n=n)
-        frame = frame[self.crop_vals[1][0]:self.crop_vals[1][1], self.crop_vals[0][0]: self.crop_vals[0][1],:]
+    def _seek(self, n):
+        #Position the decoder at or before frame n. Returns the number and
+        #image of the first frame read after the seek, or (None, None).
+        if self.index is None:
+            self.set_frame(n)
+            self._decoder_pos = n
+            return None, None
+        k = self.index.keyframe_before(n)
+        while True:
+            self.set_frame(k)
+            frame = super().read_frame()
+            if self._capture is None:
+                landed = k
+                break
+            #OpenCV seeks by frame number * fps which misses on variable
+            #frame rate files, so find where we really are from the
+            #timestamp and back off a keyframe if we overshot.
+            landed = self.index.frame_at(self._capture.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+            if landed <= n or k == 0:
+                break
+            k = self.index.keyframe_before(k - 1)
+        self.frame_num = landed + 1
+        self._decoder_pos = landed + 1
+        return landed, frame
+
+    def _decode(self, n, cache=True):
+        #_decoder_pos is the frame the decoder will return next.
+        try:
+            if not self._can_read_forward(n):
+                landed, frame = self._seek(n)
+                if landed == n:
+                    if cache:
+                        self.cache.put(n, frame)
+                    return frame
+                if landed is not None and cache:
+                    self.cache.put(landed, frame)
+            while self._decoder_pos < n:
+                skipped = super().read_frame()
+                if cache:
+                    self.cache.put(self._decoder_pos, skipped)
+                self._decoder_pos += 1
+            frame = super().read_frame()
+        except Exception:
+            #Position unknown after a failed read so force a seek next time.
+            self._decoder_pos = None
+            raise
+        self._decoder_pos = n + 1
+        if cache:
+            self.cache.put(n, frame)
         return frame
 
+    def read_frame(self, n=None, cache=True):
+        frame = self.read_uncropped(n=n, cache=cache)
+        with perf.stage('crop'):
+            if cache:
+                #A view of the cached full frame, so changing the crop is free
+                return self.crop(frame)
+            #Bulk reads copy out just the crop so the full frame is freed
+            #straight away rather than held by whatever queues the result.
+            return np.ascontiguousarray(self.crop(frame))
+
+    def iter_frames(self, start=0, stop=None, step=1):
+        '''
+        Generator of cropped frames for bulk consumers such as export.
+        Consecutive frames are decoded without seeking and are not added
+        to the cache so a long export does not flush frames being viewed.
+        Each frame is a contiguous array the size of the crop.
+        '''
+        if stop is None:
+            stop = self.num_frames
+        for n in range(start, stop, step):
+            yield self.read_frame(n=n, cache=False)
+
+    def close(self):
+        if self._proxy_builder is not None:
+            self._proxy_builder.stop()
+        with self._lock:
+            if self.source is not None:
+                self.source.close()
+            else:
+                super().close()
+
+    def cache_stats(self):
+        #Hit/miss counters and memory use of the frame cache
+        return self.cache.stats()
 
 
+def open_worker_reader(filename):
+    '''
+    Reader for a worker process or bulk job. It keeps no frame cache and
+    builds no index of its own but uses the cached index if there is one.
+    '''
+    readvid = ReadCropVideo(filename=filename, cache_mb=0, build_index=False)
+    index = load_index(filename)
+    if index is not None:
+        readvid.set_index(index)
+    return readvid
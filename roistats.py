@@ -0,0 +1,154 @@
+import threading
+import time
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from pools import spawn_pool
+from readcropvid import open_worker_reader
+
+
+STATS = ('mean', 'sum', 'min', 'max')
+
+
+def measure_frame(frame, rois, out):
+    '''
+    Statistics of each roi ((x0, x1), (y0, y1)) of frame into out, an
+    array of shape (rois, len(STATS), channels). Each statistic is one
+    numpy reduction over the roi's pixels for all channels at once.
+    '''
+    if frame.ndim == 2:
+        frame = frame[:, :, None]
+    for i, ((x0, x1), (y0, y1)) in enumerate(rois):
+        pixels = frame[y0:y1, x0:x1].reshape(-1, frame.shape[2])
+        total = pixels.sum(axis=0, dtype=np.float64)
+        out[i, 0] = total / max(len(pixels), 1)
+        out[i, 1] = total
+        out[i, 2] = pixels.min(axis=0)
+        out[i, 3] = pixels.max(axis=0)
+
+
+def clip_roi(roi, size=None):
+    '''
+    roi ((x0, x1), (y0, y1)) as ints inside a frame of size (width,
+    height), or only clipped at 0 if size is None. A negative coordinate
+    would otherwise count back from the far edge of the frame. Raises
+    ValueError if no pixels are left.
+    '''
+    (x0, x1), (y0, y1) = roi
+    width, height = size if size is not None else (np.inf, np.inf)
+    x0, x1 = [min(max(int(x), 0), width) for x in (x0, x1)]
+    y0, y1 = [min(max(int(y), 0), height) for y in (y0, y1)]
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError('ROI {} has no pixels in the frame'.format(roi))
+    return (x0, x1), (y0, y1)
+
+
+def _measure_chunk(filename, rois, start, stop, step, channels):
+    #Runs in a worker process, reading one frame at a time so memory
+    #use does not depend on the length of the chunk.
+    readvid = open_worker_reader(filename)
+    frames = range(start, stop, step)
+    values = np.empty((len(frames), len(rois), len(STATS), channels))
+    try:
+        for j, n in enumerate(frames):
+            measure_frame(readvid.read_uncropped(n=n, cache=False), rois, values[j])
+    finally:
+        readvid.close()
+    return values
+
+
+class RoiJob:
+    """
+    Intensity statistics (STATS, per channel) inside each of rois for the
+    frames range(start, stop, step) of a video.
+
+    The range is split into chunks of up to chunk frames measured in
+    a pool of worker processes, each reading its own frames. values has
+    shape (frames, rois, len(STATS), channels) and is filled in as chunks
+    finish, frames not yet measured being nan, so it can be plotted while
+    the job runs. The interface follows ExportJob. rois are clipped to
+    the frame, of size (width, height), see clip_roi.
+    """
+    stats = STATS
+
+    def __init__(self, filename, rois, start, stop, step=1, channels=3, workers=4, chunk=256, size=None):
+        self.filename = filename
+        self.rois = [clip_roi(roi, size) for roi in rois]
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.frames = np.arange(start, stop, step)
+        self.workers = workers
+        self.chunk = chunk
+        self.values = np.full((len(self.frames), len(self.rois), len(STATS), channels), np.nan)
+        self.total = len(self.frames)
+        self.done = 0
+        self.fps = 0.0
+        self.status = 'queued'
+        self.error = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def run(self, progress=None):
+        #Runs the job in the calling thread. progress(job) is called as
+        #each chunk finishes.
+        self.status = 'running'
+        t0 = time.perf_counter()
+        #Short ranges are split finer so every worker gets some
+        chunk = max(1, min(self.chunk, -(-self.total // (4 * self.workers))))
+        span = chunk * self.step
+        with spawn_pool(self.workers) as pool:
+            futures = {pool.submit(_measure_chunk, self.filename, self.rois, first,
+                                   min(first + span, self.stop), self.step, self.values.shape[3]): i
+                       for i, first in enumerate(range(self.start, self.stop, span))}
+            for future in as_completed(futures):
+                if self._cancel.is_set():
+                    break
+                try:
+                    values = future.result()
+                except Exception as e:
+                    self.error = e
+                    break
+                i = futures[future] * chunk
+                self.values[i:i + len(values)] = values
+                self.done += len(values)
+                self.fps = self.done / (time.perf_counter() - t0)
+                if progress is not None:
+                    progress(self)
+            for future in futures:
+                future.cancel()
+
+        if self.error is not None:
+            self.status = 'failed'
+        elif self.cancelled:
+            self.status = 'cancelled'
+        else:
+            self.status = 'done'
+        if progress is not None:
+            progress(self)
+        return self.status
+
+    def columns(self):
+        #Column names matching the flattened values of one frame
+        return ['roi{}_{}_c{}'.format(r, stat, c) for r in range(len(self.rois))
+                for stat in STATS for c in range(self.values.shape[3])]
+
+    def save(self, filename):
+        '''
+        .npy saves values as it is, frames being range(start, stop, step).
+        Anything else is written as CSV with a frame column then one
+        column per roi, statistic and channel.
+        '''
+        if filename.endswith('.npy'):
+            np.save(filename, self.values)
+            return
+        table = np.column_stack((self.frames, self.values.reshape(len(self.frames), -1)))
+        np.savetxt(filename, table, delimiter=',', header=','.join(['frame'] + self.columns()),
+                   comments='', fmt='%.10g')
@@ -0,0 +1,71 @@
+import threading
+
+
+class FrameScheduler:
+    """
+    Decodes the most recently requested frame on a worker thread.
+
+    request(n) replaces any request the worker has not started on, so
+    however fast frames are asked for only the newest one is decoded next
+    and the number of frames shown is limited by decode time instead of
+    requests backing up. A frame finishing after a newer request is still
+    passed on as the best available, unless cancel() has been called
+    because the display was already brought up to date some other way.
+    decode(n) returns the frame and callback(n, frame) receives it, both
+    on the worker thread.
+    """
+
+    def __init__(self, decode, callback):
+        self.decode = decode
+        self.callback = callback
+        self.dropped = 0
+        self._wanted = None
+        self._latest = None
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self, n):
+        with self._cond:
+            self._wanted = n
+            self._latest = n
+            self._cond.notify()
+
+    def cancel(self):
+        #Forget outstanding requests, e.g. when a cached frame was shown instead
+        with self._cond:
+            self._wanted = None
+            self._latest = None
+
+    @property
+    def latest(self):
+        #Most recent request, or None once cancelled
+        return self._latest
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._wanted is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    break
+                n = self._wanted
+                self._wanted = None
+            try:
+                frame = self.decode(n)
+            except Exception as e:
+                print('Could not read frame {}: {}'.format(n, e))
+                continue
+            with self._cond:
+                wanted = self._latest is not None
+            if wanted:
+                self.callback(n, frame)
+            else:
+                self.dropped += 1
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=1.0)
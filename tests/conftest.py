@@ -0,0 +1,50 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+#The viewer's modules live at the top of the repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NUM_FRAMES = 60
+FPS = 25.0
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    #Indexes, raw stores etc. go in a cache dir of each test's own
+    path = tmp_path / 'cache'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(path))
+    return path
+
+
+def synth_frame(n, width=64, height=48):
+    #Each frame differs from every other, so a wrong frame is caught
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[:, :, 0] = 4 * n
+    frame[:, :, 1] = np.arange(width, dtype=np.uint8)[None, :] * 2
+    frame[:height // 2, :, 2] = 255 - 4 * n
+    return frame
+
+
+@pytest.fixture(scope='session')
+def clip(tmp_path_factory):
+    #A short MJPG video and its frames decoded in order, which reads
+    #through ReadCropVideo must match exactly
+    path = str(tmp_path_factory.mktemp('video') / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), FPS, (64, 48))
+    for n in range(NUM_FRAMES):
+        writer.write(synth_frame(n))
+    writer.release()
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    assert len(frames) == NUM_FRAMES
+    return path, frames
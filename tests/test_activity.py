@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from activity import ActivityStore
+
+CROP = ((0, 64), (0, 48))
+
+
+@pytest.fixture
+def store(tmp_path):
+    video = tmp_path / 'video.avi'
+    video.write_bytes(b'data')
+    store = ActivityStore(str(video), 20, CROP)
+    #Quiet frames with bursts at 3-5, 10 and 17-19
+    store.values[:] = 1.0
+    store.values[3:6] = 8.0
+    store.values[10] = 9.0
+    store.values[17:] = 7.0
+    store.done[:] = 1
+    return store
+
+
+def test_events_are_rises_through_the_threshold(store):
+    assert list(store.events(5.0)) == [3, 10, 17]
+    assert list(store.events(8.5)) == [10]
+    assert list(store.events(0.5)) == [0]
+
+
+def test_frames_not_done_are_not_events(store):
+    store.done[10] = 0
+    store.done[4] = 0
+    assert list(store.events(5.0)) == [3, 5, 17]
+
+
+def test_next_and_previous_event(store):
+    assert store.next_event(0, 5.0) == 3
+    assert store.next_event(3, 5.0) == 10
+    assert store.next_event(17, 5.0) is None
+    assert store.previous_event(17, 5.0) == 10
+    assert store.previous_event(12, 5.0) == 10
+    assert store.previous_event(3, 5.0) is None
+
+
+def test_threshold_is_above_the_typical_frame(store):
+    assert 1.0 < store.threshold() < 7.0
+    store.done[:] = 0
+    assert store.threshold() == np.inf
+
+
+def test_store_is_kept_per_file_and_crop(store):
+    again = ActivityStore(store.filename, 20, CROP)
+    assert again.complete()
+    assert np.array_equal(again.values, store.values)
+    other = ActivityStore(store.filename, 20, ((0, 32), (0, 48)))
+    assert not other.done.any()
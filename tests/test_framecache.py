@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from framecache import FrameCache
+
+MB = 1024 * 1024
+
+
+def frame(mb=0.25):
+    return np.zeros(int(mb * MB), dtype=np.uint8)
+
+
+def test_hits_and_misses_are_counted():
+    cache = FrameCache(max_mb=1)
+    assert cache.get(0) is None
+    cache.put(0, frame())
+    assert cache.get(0) is not None
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['frames']) == (1, 2, 1)
+
+
+def test_least_recently_used_frame_is_evicted_first():
+    cache = FrameCache(max_mb=1)
+    for n in range(4):
+        cache.put(n, frame())
+    #Reading 0 makes 1 the least recently used
+    cache.get(0)
+    cache.put(4, frame())
+    assert 1 not in cache
+    assert all(n in cache for n in (0, 2, 3, 4))
+    assert cache.nbytes == 4 * frame().nbytes
+
+
+def test_replacing_a_frame_does_not_count_it_twice():
+    cache = FrameCache(max_mb=1)
+    cache.put(0, frame())
+    cache.put(0, frame())
+    assert len(cache) == 1
+    assert cache.nbytes == frame().nbytes
+
+
+def test_frames_over_budget_are_not_cached():
+    cache = FrameCache(max_mb=1)
+    cache.put(0, frame(2))
+    assert 0 not in cache
+    assert cache.nbytes == 0
+
+
+def test_lowering_budget_evicts_and_zero_disables():
+    cache = FrameCache(max_mb=1)
+    for n in range(4):
+        cache.put(n, frame())
+    cache.set_budget(0.5)
+    assert len(cache) == 2 and 0 not in cache and 1 not in cache
+    cache.set_budget(0)
+    assert len(cache) == 0
+    cache.put(5, frame())
+    assert 5 not in cache
+
+
+def test_cached_frames_are_read_only():
+    cache = FrameCache(max_mb=1)
+    cache.put(0, frame())
+    with pytest.raises(ValueError):
+        cache.get(0)[0] = 1
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+from frameindex import FrameIndex, index_path, load_index
+
+
+def make_index():
+    #Variable frame rate: frames 0-4 at 10 fps then 5-9 at 20 fps
+    times = np.concatenate((np.arange(5) * 0.1, 0.5 + np.arange(5) * 0.05))
+    return FrameIndex(times, [0, 4, 8])
+
+
+def test_keyframe_before():
+    index = make_index()
+    assert [index.keyframe_before(n) for n in range(10)] == [0, 0, 0, 0, 4, 4, 4, 4, 8, 8]
+    #Past the end still gives the last keyframe
+    assert index.keyframe_before(100) == 8
+
+
+def test_frame_at_picks_nearest_frame():
+    index = make_index()
+    assert index.frame_at(0.0) == 0
+    assert index.frame_at(0.14) == 1
+    assert index.frame_at(0.16) == 2
+    assert index.frame_at(0.56) == 6
+    assert index.frame_at(-1.0) == 0
+    assert index.frame_at(10.0) == 9
+    assert all(index.frame_at(index.time_of(n)) == n for n in range(10))
+
+
+def test_save_and_load(tmp_path):
+    index = make_index()
+    video = tmp_path / 'video.avi'
+    video.write_bytes(b'data')
+    index.save(index_path(str(video)))
+    loaded = load_index(str(video))
+    assert np.array_equal(loaded.times, index.times)
+    assert np.array_equal(loaded.keyframes, index.keyframes)
+    #No temporary files left in the cache dir
+    assert os.listdir(os.path.dirname(index_path(str(video)))) == [os.path.basename(index_path(str(video)))]
+
+
+def test_corrupt_index_is_deleted(tmp_path):
+    video = tmp_path / 'video.avi'
+    video.write_bytes(b'data')
+    path = index_path(str(video))
+    make_index().save(path)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert load_index(str(video)) is None
+    assert not os.path.exists(path)
@@ -0,0 +1,82 @@
+import numpy as np
+
+from multistream import StreamSet
+
+
+class FakeReader:
+    #The parts of ReadCropVideo StreamSet uses, frame n filled with value + n
+    def __init__(self, width, height, num_frames=10, value=0, grey=False):
+        self.width = width
+        self.height = height
+        self.num_frames = num_frames
+        self.value = value
+        self.grey = grey
+        self.reads = []
+
+    def read_frame(self, n):
+        self.reads.append(n)
+        shape = (self.height, self.width) if self.grey else (self.height, self.width, 3)
+        return np.full(shape, self.value + n, dtype=np.uint8)
+
+    def is_decoded(self, n):
+        return False
+
+    def crop_size(self):
+        return self.width, self.height
+
+    def close(self):
+        pass
+
+
+def test_frames_are_placed_side_by_side():
+    streams = StreamSet([FakeReader(4, 3), FakeReader(2, 5, value=100, grey=True)])
+    image = streams.read(2)
+    assert image.shape == (5, 6, 3)
+    assert streams.slots == [(0, 4), (4, 6)]
+    assert (image[:3, :4] == 2).all() and (image[3:, :4] == 0).all()
+    #A grey frame fills every channel of its slot
+    assert (image[:, 4:] == 102).all()
+    streams.close()
+
+
+def test_offsets_and_missing_frames():
+    short = FakeReader(2, 2, num_frames=5, value=100)
+    streams = StreamSet([FakeReader(2, 2), short], offsets=[0, 3])
+    image = streams.read(1)
+    assert short.reads == [4]
+    assert (image[:, 2:] == 104).all()
+    #Video 1 has no frame 5 + 3, so its slot is blank and not read
+    image = streams.read(5)
+    assert short.reads == [4]
+    assert (image[:, :2] == 5).all() and (image[:, 2:] == 0).all()
+    streams.close()
+
+
+def test_composed_frames_alternate_between_two_buffers():
+    streams = StreamSet([FakeReader(2, 2), FakeReader(2, 2)])
+    first = streams.read(1)
+    second = streams.read(2)
+    assert not np.shares_memory(first, second)
+    assert (first == 1).all()
+    #The buffer of two reads ago is reused
+    assert np.shares_memory(streams.read(3), first)
+    streams.close()
+
+
+def test_single_video_is_not_copied():
+    reader = FakeReader(4, 3)
+    frame = reader.read_frame(1)
+    reader.read_frame = lambda n: frame
+    streams = StreamSet([reader])
+    assert streams.read(1) is frame
+    assert streams.slots == []
+    streams.close()
+
+
+def test_stream_at_column():
+    streams = StreamSet([FakeReader(4, 3), FakeReader(2, 3), FakeReader(3, 3)])
+    streams.read(0)
+    assert [streams.stream_at(x) for x in (0, 3, 4, 5, 6, 8)] == [(0, 0), (0, 3), (1, 0), (1, 1), (2, 0), (2, 2)]
+    #Outside every slot falls back to the first video
+    assert streams.stream_at(20) == (0, 20)
+    streams.close()
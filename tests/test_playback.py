@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('labvision.video')
+
+from frameindex import FrameIndex
+from playback import DEFAULT_FPS, PlaybackClock, frame_rate, playback_frames
+
+
+def test_playback_frames_include_both_ends_of_the_range():
+    assert list(playback_frames(3, 0, 9)) == [3, 4, 5, 6, 7, 8, 9]
+    assert list(playback_frames(3, 0, 9, reverse=True)) == [3, 2, 1, 0]
+    assert list(playback_frames(2, 2, 10, step=4)) == [2, 6, 10]
+
+
+def test_playback_starts_inside_the_range():
+    assert list(playback_frames(20, 0, 9, step=3, reverse=True)) == [9, 6, 3, 0]
+    assert list(playback_frames(-5, 0, 4)) == [0, 1, 2, 3, 4]
+
+
+def test_missing_frame_rate_falls_back_to_default():
+    assert frame_rate(30.0) == 30.0
+    assert frame_rate(0) == frame_rate(None) == DEFAULT_FPS
+
+
+def test_clock_follows_frame_rate_and_play_rate():
+    clock = PlaybackClock(np.arange(0, 20, 2), fps=10.0, rate=2.0)
+    assert clock.position(5.0) == 0
+    clock.start(now=5.0)
+    #Every other frame at 10 fps played at twice speed is one frame per 0.1 s
+    assert [clock.position(5.0 + t) for t in (0.0, 0.05, 0.15, 0.25, 10.0)] == [0, 0, 1, 2, 9]
+
+
+def test_clock_uses_index_times_in_reverse():
+    #Frames 0-4 at 10 fps then 5-9 at 20 fps
+    times = np.concatenate((np.arange(5) * 0.1, 0.5 + np.arange(5) * 0.05))
+    clock = PlaybackClock(np.arange(9, -1, -1), fps=0, index=FrameIndex(times, [0]))
+    clock.start(now=0.0)
+    #The 20 fps frames go by twice as fast as the 10 fps ones
+    assert clock.position(0.22) == 4
+    assert clock.position(0.45) == 6
+    assert clock.position(0.75) == 9
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from rawstore import RawFrameStore, RawStoreWriter, find_raw_store, raw_store_path
+
+SHAPE = (20, 8, 6, 3)
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'video.avi'
+    path.write_bytes(b'data')
+    return str(path)
+
+
+def frame(i):
+    return np.full(SHAPE[1:], i, dtype=np.uint8)
+
+
+def test_interrupted_unpack_resumes_from_last_chunk(video):
+    path = raw_store_path(video)
+    store = RawFrameStore.create(path, SHAPE, np.uint8, video, 10, 2)
+    writer = RawStoreWriter(store, chunk=4)
+    for i in range(7):
+        writer.add_frame(frame(i))
+    #Interrupted without close, so only the first chunk is recorded
+    store = RawFrameStore.create(path, SHAPE, np.uint8, video, 10, 2)
+    assert store.done == 4
+    writer = RawStoreWriter(store, done=store.done, chunk=4)
+    for i in range(store.done, SHAPE[0]):
+        writer.add_frame(frame(i))
+    writer.close()
+
+    store = find_raw_store(video)
+    assert store.complete
+    assert all(np.array_equal(store.read(10 + 2 * i), frame(i)) for i in range(SHAPE[0]))
+
+
+def test_store_maps_video_frames_by_start_and_step(video):
+    store = RawFrameStore.create(raw_store_path(video), SHAPE, np.uint8, video, 10, 2)
+    store.set_done(5)
+    assert store.index_of(10) == 0
+    assert store.index_of(18) == 4
+    assert store.index_of(11) is None
+    assert store.index_of(8) is None
+    #Not unpacked yet
+    assert store.index_of(20) is None
+
+
+def test_a_different_range_starts_a_new_store(video):
+    path = raw_store_path(video)
+    store = RawFrameStore.create(path, SHAPE, np.uint8, video, 10, 2)
+    store.set_done(8)
+    assert RawFrameStore.create(path, SHAPE, np.uint8, video, 0, 2).done == 0
+
+
+def test_store_of_a_changed_video_is_ignored(video):
+    RawFrameStore.create(raw_store_path(video), SHAPE, np.uint8, video, 0, 1).set_done(SHAPE[0])
+    assert find_raw_store(video) is not None
+    with open(video, 'ab') as f:
+        f.write(b'more')
+    assert find_raw_store(video) is None
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('labvision.video')
+
+from conftest import FPS, NUM_FRAMES
+from frameindex import FrameIndex
+from readcropvid import ReadCropVideo
+
+
+def open_reader(path, keyframe_every=None, **kwargs):
+    readvid = ReadCropVideo(filename=path, build_index=False, use_raw=False, **kwargs)
+    if keyframe_every is not None:
+        readvid.set_index(FrameIndex(np.arange(NUM_FRAMES) / FPS, np.arange(0, NUM_FRAMES, keyframe_every)))
+    return readvid
+
+
+@pytest.mark.parametrize('keyframe_every', [None, 10])
+def test_forward_and_backward_seeks_return_the_right_frames(clip, keyframe_every):
+    path, frames = clip
+    readvid = open_reader(path, keyframe_every, cache_mb=0)
+    #Forward within max_skip, forward past it, backward, backward to 0, last
+    for n in [3, 5, 12, 40, 41, 20, 2, 0, 59, 30]:
+        assert np.array_equal(readvid.read_frame(n=n, cache=False), frames[n]), n
+    readvid.close()
+
+
+def test_frames_read_on_the_way_are_cached(clip):
+    path, frames = clip
+    readvid = open_reader(path, keyframe_every=10)
+    readvid.read_frame(n=14)
+    #Seeking to keyframe 10 then reading forward decodes 10 to 14
+    assert all(n in readvid.cache for n in range(10, 15))
+    assert readvid.is_decoded(12) and not readvid.is_decoded(15)
+    misses = readvid.cache_stats()['misses']
+    assert np.array_equal(readvid.read_frame(n=12), frames[12])
+    assert readvid.cache_stats()['misses'] == misses
+    readvid.close()
+
+
+def test_seek_backs_off_a_keyframe_when_it_overshoots(clip):
+    path, frames = clip
+    readvid = open_reader(path, keyframe_every=10, cache_mb=0)
+    seeks = []
+    set_frame = readvid.set_frame
+
+    def record(k):
+        seeks.append(k)
+        set_frame(k)
+
+    class Capture:
+        #The first seek lands ten frames late, as it can by frame number
+        #on variable frame rate files, the next one where asked
+        def get(self, prop):
+            late = 10 if len(seeks) == 1 else 0
+            return 1000 * (seeks[-1] + late) / FPS
+
+    readvid.set_frame = record
+    readvid._capture = Capture()
+    landed, frame = readvid._seek(25)
+    assert seeks == [20, 10]
+    assert landed == 10
+    assert np.array_equal(frame, frames[10])
+    readvid.close()
+
+
+def test_crop_is_a_view_of_the_cached_frame(clip):
+    path, frames = clip
+    readvid = open_reader(path)
+    readvid.set_crop(((10, 30), (5, 25)))
+    cropped = readvid.read_frame(n=7)
+    assert cropped.shape == (20, 20, 3)
+    assert np.array_equal(cropped, frames[7][5:25, 10:30])
+    assert np.shares_memory(cropped, readvid.cache.get(7))
+    bulk = readvid.read_frame(n=8, cache=False)
+    assert bulk.flags['C_CONTIGUOUS'] and 8 not in readvid.cache
+    readvid.close()
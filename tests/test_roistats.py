@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('labvision.video')
+
+from roistats import STATS, RoiJob, clip_roi, measure_frame
+
+
+def test_measure_frame_per_channel():
+    frame = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+    rois = [((1, 4), (0, 2)), ((0, 6), (0, 4))]
+    out = np.empty((len(rois), len(STATS), 3))
+    measure_frame(frame, rois, out)
+    for i, ((x0, x1), (y0, y1)) in enumerate(rois):
+        pixels = frame[y0:y1, x0:x1].reshape(-1, 3).astype(np.float64)
+        expected = [pixels.mean(axis=0), pixels.sum(axis=0), pixels.min(axis=0), pixels.max(axis=0)]
+        assert np.allclose(out[i], expected)
+
+
+def test_measure_grey_frame():
+    frame = np.array([[0, 10], [20, 250]], dtype=np.uint8)
+    out = np.empty((1, len(STATS), 1))
+    measure_frame(frame, [((0, 2), (0, 2))], out)
+    #The sum does not wrap at 255
+    assert list(out[0, :, 0]) == [70, 280, 0, 250]
+
+
+def test_rois_are_clipped_to_the_frame():
+    assert clip_roi(((-5, 20), (3, 400)), (100, 50)) == ((0, 20), (3, 50))
+    assert clip_roi(((-5, 20), (3, 400))) == ((0, 20), (3, 400))
+    with pytest.raises(ValueError):
+        clip_roi(((120, 130), (0, 5)), (100, 50))
+    job = RoiJob('video.avi', [((-10, 30), (0, 60))], 0, 10, size=(64, 48))
+    assert job.rois == [((0, 30), (0, 48))]
+    assert job.values.shape == (10, 1, len(STATS), 3) and np.isnan(job.values).all()
+
+
+def test_job_matches_frames_read_in_order(clip):
+    path, frames = clip
+    rois = [((10, 30), (5, 25)), ((0, 64), (0, 48))]
+    job = RoiJob(path, rois, 5, 50, step=3, workers=2, chunk=4, size=(64, 48))
+    assert job.run() == 'done'
+    expected = np.empty_like(job.values)
+    for i, n in enumerate(range(5, 50, 3)):
+        measure_frame(frames[n], rois, expected[i])
+    assert np.allclose(job.values, expected)
@@ -0,0 +1,73 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from conftest import synth_frame
+from framesources import open_source
+from writers import HDF5Writer, ImageSequenceWriter, NpyWriter, make_writer
+
+
+def frames(count=7, grey=False):
+    frames = [synth_frame(n, width=16, height=12) for n in range(count)]
+    return [frame[:, :, 0] for frame in frames] if grey else frames
+
+
+def write(writer, frames):
+    for frame in frames:
+        writer.add_frame(frame)
+    writer.close()
+
+
+def test_writer_picked_by_extension(tmp_path):
+    frame = frames(1)[0]
+    assert isinstance(make_writer(str(tmp_path / 'a.png'), frame, 1), ImageSequenceWriter)
+    npy = make_writer(str(tmp_path / 'a.npy'), frame, 1)
+    assert isinstance(npy, NpyWriter)
+    npy.close()
+    assert make_writer(str(tmp_path / 'a.mp4'), frame, 1) is None
+
+
+@pytest.mark.parametrize('ext', ['.png', '.tif'])
+def test_image_sequence_round_trip(tmp_path, ext):
+    expected = frames()
+    writer = ImageSequenceWriter(str(tmp_path / ('out' + ext)), start=10, step=3, workers=2)
+    write(writer, expected)
+    #Numbered by video frame
+    assert os.path.basename(writer.paths[1]) == 'out_000013' + ext
+    source = open_source(str(tmp_path / ('out_*' + ext)))
+    assert source.num_frames == len(expected)
+    assert all(np.array_equal(source.read(i), frame) for i, frame in enumerate(expected))
+    writer.remove()
+    assert glob.glob(str(tmp_path / ('*' + ext))) == []
+
+
+@pytest.mark.parametrize('grey', [False, True])
+def test_npy_round_trip(tmp_path, grey):
+    expected = frames(grey=grey)
+    output = str(tmp_path / 'out.npy')
+    write(NpyWriter(output, len(expected), expected[0]), expected)
+    assert np.array_equal(np.load(output), np.array(expected))
+    source = open_source(output)
+    assert np.array_equal(source.read(3), expected[3])
+
+
+@pytest.mark.parametrize('grey', [False, True])
+def test_hdf5_round_trip(tmp_path, grey):
+    h5py = pytest.importorskip('h5py')
+    expected = frames(grey=grey)
+    output = str(tmp_path / 'out.h5')
+    #Three frames a chunk, so the last chunk is part filled
+    writer = HDF5Writer(output, len(expected), expected[0], chunk_bytes=3 * expected[0].nbytes,
+                        attrs={'fps': 12.5}, workers=2)
+    write(writer, expected)
+    with h5py.File(output, 'r') as f:
+        dataset = f['frames']
+        assert dataset.chunks[0] == 3
+        assert dataset.attrs['fps'] == 12.5
+        assert np.array_equal(dataset[:], np.array(expected))
+    source = open_source(output + '::/frames')
+    assert source.fps == 12.5
+    assert np.array_equal(source.read(6), expected[6])
+    source.close()
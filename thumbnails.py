@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+
+from filecache import cache_path, open_npy
+from framesources import as_uint8
+from pools import PoolBuilder
+
+
+class ThumbnailStore:
+    """
+    count evenly spaced thumbnails of a video, thumbnail i being of frame
+    frame_of(i). Kept in the cache dir as a memory mapped .npy plus a mask
+    of which are done, so several processes can fill it at once and a
+    reopened video shows whatever was already made instantly.
+    """
+
+    def __init__(self, filename, num_frames, width, height, count=256, thumb_height=48):
+        self.filename = filename
+        self.num_frames = num_frames
+        self.width = width
+        self.height = height
+        self.count = min(count, num_frames)
+        thumb_width = max(1, int(round(thumb_height * width / height)))
+        self.shape = (self.count, thumb_height, thumb_width, 3)
+        self.path = cache_path(filename, '.thumbs{}x{}.npy'.format(self.count, thumb_height))
+        self.thumbs = open_npy(self.path, self.shape, np.uint8)
+        self.done = open_npy(self.path[:-4] + '.done.npy', (self.count,), np.uint8)
+
+    def frame_of(self, i):
+        return i * self.num_frames // self.count
+
+    def index_of(self, frame):
+        #Thumbnail nearest frame
+        return min(self.count - 1, max(0, int(round(frame * self.count / self.num_frames))))
+
+    def nearest(self, i):
+        #Closest finished thumbnail to i, or None if there are none yet
+        done = np.flatnonzero(self.done)
+        if len(done) == 0:
+            return None
+        j = np.searchsorted(done, i)
+        if j == len(done) or (j > 0 and i - done[j - 1] < done[j] - i):
+            j -= 1
+        return int(done[j])
+
+    def complete(self):
+        return bool(self.done.all())
+
+
+def refinement_order(count):
+    '''
+    Thumbnail indices ordered coarse to fine: widely spaced ones first,
+    then those half way between, and so on, so the strip fills in evenly.
+    '''
+    order = []
+    seen = np.zeros(count, dtype=bool)
+    step = 1
+    while step * 2 < count:
+        step *= 2
+    while step >= 1:
+        for i in range(0, count, step):
+            if not seen[i]:
+                seen[i] = True
+                order.append(i)
+        step //= 2
+    return order
+
+
+def _render(filename, num_frames, width, height, count, thumb_height, indices):
+    #Runs in a worker process with its own reader and its own
+    #mapping of the store. Frames are read in order to avoid seeks.
+    from readcropvid import open_worker_reader
+    store = ThumbnailStore(filename, num_frames, width, height, count=count, thumb_height=thumb_height)
+    readvid = open_worker_reader(filename)
+    try:
+        for i in sorted(indices):
+            frame = as_uint8(readvid.read_uncropped(n=store.frame_of(i), cache=False))
+            if frame.ndim == 2:
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+            store.thumbs[i] = cv2.resize(frame, (store.shape[2], store.shape[1]), interpolation=cv2.INTER_AREA)
+            store.done[i] = 1
+        store.thumbs.flush()
+        store.done.flush()
+    finally:
+        readvid.close()
+
+
+class ThumbnailBuilder(PoolBuilder):
+    """
+    Fills a ThumbnailStore using a pool of worker processes. Work is
+    handed out one refinement level at a time, split between workers,
+    so the whole strip is covered coarsely before any of it in detail.
+    """
+    label = 'Thumbnails'
+
+    def __init__(self, store, workers=2):
+        super().__init__(workers)
+        self.store = store
+
+    def batches(self):
+        todo = [i for i in refinement_order(self.store.count) if not self.store.done[i]]
+        batch = 4 * self.workers
+        while todo:
+            level, todo = todo[:batch], todo[batch:]
+            batch *= 2
+            yield [(_render, (self.store.filename, self.store.num_frames, self.store.width, self.store.height,
+                              self.store.count, self.store.shape[1], level[w::self.workers]))
+                   for w in range(min(self.workers, len(level)))]
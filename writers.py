@@ -0,0 +1,169 @@
+'''
+Writers for exporting frames as data rather than video. Each has the
+add_frame/close interface of labvision's WriteVideo so ExportJob can use
+any of them; make_writer picks one from the output's extension.
+
+Encoding and compression run on a thread pool (OpenCV and zlib release
+the GIL) with a bounded number of frames in flight, so they use several
+cores and overlap with decoding without frames piling up in memory.
+'''
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+SEQUENCE_EXTENSIONS = ('.png', '.tif', '.tiff')
+HDF5_EXTENSIONS = ('.h5', '.hdf5')
+
+
+class _PooledWriter:
+    #Runs encode jobs on a thread pool keeping at most 2 * workers in flight
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+
+    def _submit(self, fn, *args):
+        while len(self._pending) >= 2 * self.workers:
+            self._finish(self._pending.popleft())
+        self._pending.append(self._pool.submit(fn, *args))
+
+    def _finish(self, future):
+        #Raises anything the job raised
+        return future.result()
+
+    def close(self):
+        try:
+            while self._pending:
+                self._finish(self._pending.popleft())
+        finally:
+            self._pool.shutdown(wait=True)
+
+
+class ImageSequenceWriter(_PooledWriter):
+    """
+    One lossless image per frame. output dir/name.png (or .tif) writes
+    dir/name_<frame number>.png, numbered by video frame from start in
+    steps of step.
+    """
+
+    def __init__(self, output, start=0, step=1, workers=None):
+        super().__init__(workers)
+        self.stem, self.ext = os.path.splitext(output)
+        self.frame_num = start
+        self.step = step
+        self.paths = []
+
+    def add_frame(self, frame):
+        path = '{}_{:06d}{}'.format(self.stem, self.frame_num, self.ext)
+        self.paths.append(path)
+        self._submit(self._write, path, frame)
+        self.frame_num += self.step
+
+    @staticmethod
+    def _write(path, frame):
+        if not cv2.imwrite(path, frame):
+            raise IOError('Cannot write ' + path)
+
+    def remove(self):
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class NpyWriter:
+    """
+    All frames in one .npy file, written straight into a memory mapping of
+    it so it can be opened with np.load(output, mmap_mode='r').
+    """
+
+    def __init__(self, output, count, frame):
+        self.output = output
+        self.frames = np.lib.format.open_memmap(output, mode='w+', dtype=frame.dtype,
+                                                shape=(count,) + frame.shape)
+        self.i = 0
+
+    def add_frame(self, frame):
+        self.frames[self.i] = frame
+        self.i += 1
+
+    def close(self):
+        self.frames.flush()
+        del self.frames
+
+
+class HDF5Writer(_PooledWriter):
+    """
+    Frames in a gzip compressed, chunked HDF5 dataset of shape (count,
+    height, width[, channels]). Each chunk holds as many whole frames as
+    fit in about chunk_bytes. Chunks are compressed on the thread pool
+    and written in order with write_direct_chunk, so HDF5's own single
+    threaded filter is bypassed while the file stays readable by any
+    HDF5 reader. attrs are stored on the dataset.
+    """
+
+    def __init__(self, output, count, frame, dataset='frames', level=4, chunk_bytes=1 << 20, attrs=None,
+                 workers=None):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('Writing HDF5 needs h5py')
+        super().__init__(workers)
+        self.level = level
+        self.per_chunk = max(1, min(count, chunk_bytes // max(frame.nbytes, 1)))
+        self.file = h5py.File(output, 'w')
+        self.dataset = self.file.create_dataset(dataset, shape=(count,) + frame.shape, dtype=frame.dtype,
+                                                chunks=(self.per_chunk,) + frame.shape,
+                                                compression='gzip', compression_opts=level)
+        for key, value in (attrs or {}).items():
+            self.dataset.attrs[key] = value
+        self._buffer = np.zeros((self.per_chunk,) + frame.shape, dtype=frame.dtype)
+        self._filled = 0
+        self._chunk = 0
+
+    def add_frame(self, frame):
+        self._buffer[self._filled] = frame
+        self._filled += 1
+        if self._filled == self.per_chunk:
+            self._flush_buffer()
+
+    def _flush_buffer(self):
+        #A chunk is always whole, a last part filled one is padded with zeros
+        self._buffer[self._filled:] = 0
+        offset = (self._chunk * self.per_chunk,) + (0,) * (self._buffer.ndim - 1)
+        self._submit(self._compress, offset, self._buffer)
+        self._buffer = np.zeros_like(self._buffer)
+        self._filled = 0
+        self._chunk += 1
+
+    def _compress(self, offset, data):
+        return offset, zlib.compress(data.tobytes(), self.level)
+
+    def _finish(self, future):
+        offset, data = future.result()
+        self.dataset.id.write_direct_chunk(offset, data)
+
+    def close(self):
+        try:
+            if self._filled:
+                self._flush_buffer()
+            super().close()
+        finally:
+            self.file.close()
+
+
+def make_writer(output, frame, count, start=0, step=1, attrs=None):
+    #Writer for the output's extension, or None for a video
+    ext = os.path.splitext(output)[1].lower()
+    if ext in SEQUENCE_EXTENSIONS:
+        return ImageSequenceWriter(output, start=start, step=step)
+    if ext == '.npy':
+        return NpyWriter(output, count, frame)
+    if ext in HDF5_EXTENSIONS:
+        return HDF5Writer(output, count, frame, attrs=attrs)
+    return None